@@ -1,14 +1,48 @@
 from functools import lru_cache
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal, Optional
 import os
 
+from app.types.generation_profile import ProfileName
+
 class Settings(BaseSettings):
     """Application settings using Pydantic BaseSettings."""
     openai_api_key: str = "test-key"  # Default for tests
     cors_allowed_origins: List[str] = ["*"]
     log_level: str = "INFO"
+    # Generation profile used when a request doesn't choose one (see app/core/profiles.py)
+    default_generation_profile: ProfileName = "balanced"
+    # Style references for images.edit are downscaled and recompressed before upload
+    reference_image_max_size: int = 512
+    reference_image_format: Literal["png", "jpeg", "webp"] = "jpeg"
+    reference_image_quality: int = 85
+    reference_image_cache_size: int = 32
+    # Concurrency limits and readiness probe thresholds
+    max_concurrent_generations: int = 8
+    openai_max_connections: int = 20
+    loop_lag_sample_interval: float = 0.5
+    readiness_lag_window: int = 10
+    readiness_max_loop_lag_ms: float = 250.0
+    readiness_max_in_flight_requests: int = 64
+    readiness_max_queue_depth: int = 4
+    readiness_max_pool_utilization: float = 0.9
+    # Generated images are stored by content hash; least recently used ones are evicted in the background
+    image_store_path: str = "output_folder"
+    image_store_max_bytes: int = 2 * 1024 ** 3
+    image_store_max_age_days: Optional[int] = None
+    image_store_min_idle_seconds: float = 300.0
+    image_store_eviction_interval: float = 60.0
+    # Generated fables are recorded in a local SQLite database for search and reuse
+    fable_store_path: str = "fables.db"
+    fable_reuse_age_tolerance: int = 1
+    fable_reuse_min_similarity: float = 0.75
+    # Reuse a stored illustration when a new prompt is close enough to an indexed one
+    illustration_reuse_enabled: bool = False
+    illustration_reuse_threshold: float = 0.8
+    illustration_index_path: str = "illustrations.db"
+    illustration_max_shingle_df: float = 0.2
+    illustration_max_candidates: int = 64
 
     model_config = ConfigDict(
         env_file=".env",
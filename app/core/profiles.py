@@ -0,0 +1,55 @@
+from typing import Dict, Optional
+
+from app.core.config import get_settings
+from app.types.generation_profile import GenerationProfile
+
+GENERATION_PROFILES: Dict[str, GenerationProfile] = {
+    # Interactive traffic: small model, low quality images generated independently, tight timeouts
+    "fast": GenerationProfile(
+        name="fast",
+        chat_model="gpt-4.1-mini",
+        base_max_tokens=350,
+        max_tokens_per_age_year=15,
+        max_tokens_per_image=60,
+        min_max_tokens=600,
+        max_tokens_cap=1000,
+        image_quality="low",
+        image_size="1024x1024",
+        consistency="prompt_only",
+        request_timeout=30.0,
+    ),
+    # Default: never less budget than the original fixed 1000 tokens, API default image quality
+    "balanced": GenerationProfile(
+        name="balanced",
+        chat_model="gpt-4.1",
+        base_max_tokens=500,
+        max_tokens_per_age_year=25,
+        max_tokens_per_image=80,
+        min_max_tokens=1000,
+        max_tokens_cap=2000,
+        image_quality="auto",
+        image_size="1024x1024",
+        consistency="reference",
+        request_timeout=120.0,
+    ),
+    "premium": GenerationProfile(
+        name="premium",
+        chat_model="gpt-4.1",
+        base_max_tokens=600,
+        max_tokens_per_age_year=40,
+        max_tokens_per_image=120,
+        min_max_tokens=1500,
+        max_tokens_cap=3000,
+        image_quality="high",
+        image_size="1024x1536",
+        consistency="reference",
+        request_timeout=300.0,
+    ),
+}
+
+def get_generation_profile(name: Optional[str] = None) -> GenerationProfile:
+    """Get a generation profile by name, falling back to the default profile from settings."""
+    profile_name = name or get_settings().default_generation_profile
+    if profile_name not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown generation profile: {profile_name}")
+    return GENERATION_PROFILES[profile_name]
@@ -0,0 +1,159 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import threading
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.types.health import ReadinessResponse
+
+logger = get_logger(__name__)
+
+class ReadinessMonitor:
+    """
+    Tracks worker saturation for the readiness probe:
+    event-loop lag sampled by a background task, in-flight requests, generation requests
+    queued for a free slot, and in-flight OpenAI calls relative to the usable share of the HTTP connection pool.
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self._lock = threading.Lock()
+        self._lag_samples = deque(maxlen=settings.readiness_lag_window)
+        self._sampler: Optional[asyncio.Task] = None
+        self._generation_slots = asyncio.Semaphore(settings.max_concurrent_generations)
+        self.in_flight_requests = 0
+        self.queue_depth = 0
+        self.generations_in_progress = 0
+        self.upstream_in_flight = 0
+
+    def start(self) -> None:
+        """Start the background event-loop lag sampler on the running loop."""
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.get_running_loop().create_task(self._sample_loop_lag())
+
+    async def stop(self) -> None:
+        if self._sampler is not None:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+
+    async def _sample_loop_lag(self) -> None:
+        """Sleep for a fixed interval and record how late the loop woke us up."""
+        interval = get_settings().loop_lag_sample_interval
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - start - interval, 0.0)
+            with self._lock:
+                self._lag_samples.append(lag)
+
+    @property
+    def loop_lag_ms(self) -> float:
+        """Worst event-loop lag over the recent sample window, in milliseconds."""
+        with self._lock:
+            return max(self._lag_samples, default=0.0) * 1000
+
+    @contextmanager
+    def track_request(self) -> Iterator[None]:
+        with self._lock:
+            self.in_flight_requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight_requests -= 1
+
+    @asynccontextmanager
+    async def generation_slot(self) -> AsyncIterator[None]:
+        """Wait for one of settings.max_concurrent_generations slots; waiting requests count as queued."""
+        with self._lock:
+            self.queue_depth += 1
+        try:
+            await self._generation_slots.acquire()
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+        with self._lock:
+            self.generations_in_progress += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.generations_in_progress -= 1
+            self._generation_slots.release()
+
+    @contextmanager
+    def upstream_call(self) -> Iterator[None]:
+        """Count an OpenAI call holding a connection from the shared pool."""
+        with self._lock:
+            self.upstream_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.upstream_in_flight -= 1
+
+    def snapshot(self) -> ReadinessResponse:
+        """Current gauges, with the reasons the worker is not ready if any threshold is exceeded."""
+        settings = get_settings()
+        loop_lag_ms = self.loop_lag_ms
+        with self._lock:
+            in_flight_requests = self.in_flight_requests
+            queue_depth = self.queue_depth
+            generations_in_progress = self.generations_in_progress
+            # OpenAI calls only run inside generation slots, so no more connections than slots can be in use
+            usable_connections = max(min(settings.openai_max_connections, settings.max_concurrent_generations), 1)
+            pool_utilization = self.upstream_in_flight / usable_connections
+
+        reasons = []
+        if loop_lag_ms > settings.readiness_max_loop_lag_ms:
+            reasons.append(f"event loop lag {loop_lag_ms:.0f}ms exceeds {settings.readiness_max_loop_lag_ms:.0f}ms")
+        if in_flight_requests > settings.readiness_max_in_flight_requests:
+            reasons.append(f"{in_flight_requests} in-flight requests exceed {settings.readiness_max_in_flight_requests}")
+        if queue_depth > settings.readiness_max_queue_depth:
+            reasons.append(f"{queue_depth} queued generations exceed {settings.readiness_max_queue_depth}")
+        if pool_utilization > settings.readiness_max_pool_utilization:
+            reasons.append(
+                f"connection pool utilization {pool_utilization:.0%} exceeds {settings.readiness_max_pool_utilization:.0%}"
+            )
+
+        return ReadinessResponse(
+            status="not_ready" if reasons else "ready",
+            loop_lag_ms=round(loop_lag_ms, 1),
+            in_flight_requests=in_flight_requests,
+            queue_depth=queue_depth,
+            generations_in_progress=generations_in_progress,
+            pool_utilization=round(pool_utilization, 3),
+            reasons=reasons,
+        )
+
+class InFlightRequestMiddleware:
+    """
+    Count HTTP requests as in flight until the app has sent the whole response,
+    so a streamed body counts for as long as it streams. Health probes are not counted,
+    so they don't report their own traffic.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/health"):
+            await self.app(scope, receive, send)
+            return
+        with get_readiness_monitor().track_request():
+            await self.app(scope, receive, send)
+
+@lru_cache()
+def get_readiness_monitor() -> ReadinessMonitor:
+    """Get the shared readiness monitor instance."""
+    return ReadinessMonitor()
@@ -1,19 +1,46 @@
-from fastapi import FastAPI, HTTPException
-from app.services.fable_service import fable_generation_handler
+from contextlib import asynccontextmanager
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.services.fable_service import fable_generation_handler, fable_generation_stream_handler
+from app.services.fable_store import get_fable_store
+from app.services.image_store import import_legacy_images, run_image_eviction
 from app.core.config import get_settings
 from app.core.logging import setup_logging, get_logger
+from app.core.readiness import InFlightRequestMiddleware, get_readiness_monitor
 from fastapi.middleware.cors import CORSMiddleware
-from app.types.health import HealthResponse
+from app.types.health import HealthResponse, ReadinessResponse
 from app.types.fable import FableRequest, FableResponse
+from app.types.fable_store import FableSearchResponse
 
 settings = get_settings()
 logger = get_logger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sample event-loop lag in the background for the readiness probe
+    monitor = get_readiness_monitor()
+    monitor.start()
+    # Index images saved by earlier versions before serving, so they count toward the disk budget
+    await asyncio.to_thread(import_legacy_images)
+    # Keep the image store within its disk budget
+    eviction = asyncio.create_task(run_image_eviction())
+    yield
+    eviction.cancel()
+    try:
+        await eviction
+    except asyncio.CancelledError:
+        pass
+    await monitor.stop()
+
 # Initialize FastAPI app with custom Swagger UI configuration
 app = FastAPI(
     title="Fable Generator API",
     description="Generate creative fables with AI-generated illustrations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Set up logging
@@ -28,6 +55,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Count in-flight requests for the readiness probe, including streamed bodies until they finish
+app.add_middleware(InFlightRequestMiddleware)
+
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """
@@ -40,6 +70,23 @@ async def health_check():
         status="healthy"
     )
 
+@app.get("/health/ready", response_model=ReadinessResponse, tags=["Health"],
+         responses={503: {"model": ReadinessResponse, "description": "Worker is saturated"}})
+async def readiness_check(response: Response):
+    """
+    Readiness probe for load balancers.
+
+    Reports event-loop lag, in-flight requests, queued generations and OpenAI connection pool
+    utilization, and responds with 503 when any of them exceeds its configured threshold.
+
+    Returns:
+        ReadinessResponse: The readiness status, current gauges and reasons for not being ready
+    """
+    readiness = get_readiness_monitor().snapshot()
+    if readiness.reasons:
+        response.status_code = 503
+    return readiness
+
 @app.post("/generate_fable", response_model=FableResponse, tags=["Fables"])
 async def generate_fable(request: FableRequest):
     """
@@ -50,6 +97,8 @@ async def generate_fable(request: FableRequest):
     - main_character: The protagonist of the story
     - age: Target age of the reader (affects language complexity)
     - num_images: Number of illustrations to generate (default: 2)
+    - reuse_existing: Serve a stored fable if a close match exists (default: false)
+    - profile: Generation profile, one of fast, balanced or premium (default: from settings)
     
     Returns:
         FableResponse: The generated fable with moral and illustrations
@@ -58,16 +107,78 @@ async def generate_fable(request: FableRequest):
         HTTPException: If OpenAI API key is not configured or other errors occur
     """
     try:
-        result = fable_generation_handler(
-            world_description=request.world_description,
-            main_character=request.main_character,
-            age=request.age,
-            num_images=request.num_images,
-        )
+        # Generation makes blocking OpenAI calls, so it runs in the threadpool within a generation slot
+        async with get_readiness_monitor().generation_slot():
+            result = await run_in_threadpool(
+                fable_generation_handler,
+                world_description=request.world_description,
+                main_character=request.main_character,
+                age=request.age,
+                num_images=request.num_images,
+                reuse_existing=request.reuse_existing,
+                profile=request.profile,
+            )
         return result
     except Exception as e:
         error_msg = str(e)
         if "API key" in error_msg or "invalid_api_key" in error_msg:
             raise HTTPException(status_code=401, detail=error_msg)
         logger.error(f"Error generating fable: {error_msg}")
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg) 
+
+@app.post("/generate_fable/stream", response_model=FableResponse, tags=["Fables"])
+async def generate_fable_stream(request: FableRequest):
+    """
+    Generate a fable like /generate_fable, but stream the JSON response body.
+
+    Illustrations are kept on disk and base64-encoded chunk by chunk while the body is written,
+    so peak memory per request stays roughly constant in the number of images.
+    The response body has the same schema as FableResponse.
+
+    Raises:
+        HTTPException: If OpenAI API key is not configured or other errors occur
+    """
+    try:
+        async with get_readiness_monitor().generation_slot():
+            body = await run_in_threadpool(
+                fable_generation_stream_handler,
+                world_description=request.world_description,
+                main_character=request.main_character,
+                age=request.age,
+                num_images=request.num_images,
+                reuse_existing=request.reuse_existing,
+                profile=request.profile,
+            )
+    except Exception as e:
+        error_msg = str(e)
+        if "API key" in error_msg or "invalid_api_key" in error_msg:
+            raise HTTPException(status_code=401, detail=error_msg)
+        logger.error(f"Error generating fable: {error_msg}")
+        raise HTTPException(status_code=500, detail=error_msg)
+    return StreamingResponse(body, media_type="application/json")
+
+
+@app.get("/fables/search", response_model=FableSearchResponse, tags=["Fables"])
+async def search_fables(
+    q: Optional[str] = Query(None, description="Keywords to find anywhere in the fable or its request"),
+    world: Optional[str] = Query(None, description="Words that must appear in the world description"),
+    character: Optional[str] = Query(None, description="Words that must appear in the main character"),
+    min_age: Optional[int] = Query(None, description="Minimum reader age"),
+    max_age: Optional[int] = Query(None, description="Maximum reader age"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    Search previously generated fables.
+
+    Returns:
+        FableSearchResponse: Matching stored fables, most relevant first
+    """
+    results = get_fable_store().search(
+        query=q,
+        world=world,
+        character=character,
+        min_age=min_age,
+        max_age=max_age,
+        limit=limit,
+    )
+    return FableSearchResponse(results=results)
@@ -1,20 +1,46 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional
 import base64
 from io import BytesIO
-from datetime import datetime
 import os
 
 from app.services.openai_client import generate_fable_and_prompts, generate_illustration_image
+from app.services.fable_stream import iter_fable_json
+from app.services.fable_store import get_fable_store
+from app.services.illustration_index import get_illustration_index
+from app.services.image_store import get_image_store
+from app.types.fable_store import StoredFable
+from app.types.openai_response import OpenAiResponse
+from app.core.config import get_settings
 from app.core.logging import get_logger
+from app.core.profiles import get_generation_profile
+from app.types.generation_profile import GenerationProfile
 
+settings = get_settings()
 logger = get_logger(__name__)
 
-def fable_generation_handler(world_description: str, main_character: str, age: int, num_images: int = 2) -> Dict[str, Any]:
+def fable_generation_handler(world_description: str, main_character: str, age: int, num_images: int = 2, reuse_existing: bool = False, profile: Optional[str] = None) -> Dict[str, Any]:
     """
     Main service function that:
-    1) Generate fable, moral and prompts for image generation using GPT-4.1
-    2) Generate images using the optimized prompts, using previous image as reference for style consistency
+    1) Generate fable, moral and prompts for image generation using the profile's chat model
+    2) Generate images using the optimized prompts; with the "reference" consistency strategy
+       the previous image is used as reference for style consistency
+    3) Record the fable in the fable store
+    profile names a generation profile; the default profile from settings is used when omitted.
+    If reuse_existing is set and a close match is already stored, it is returned instead.
     """
+    generation_profile = get_generation_profile(profile)
+    if reuse_existing:
+        stored = _find_reusable_fable(world_description, main_character, age, num_images, generation_profile.name)
+        if stored is not None:
+            return {
+                "title": stored.title,
+                "fable": stored.fable,
+                "moral": stored.moral,
+                "illustrations": [
+                    {"prompt": prompt, "image": _load_base64_image(path)}
+                    for prompt, path in zip(stored.image_prompts, stored.image_paths)
+                ]
+            }
 
     # 1) Generate the fable and prompts
     open_ai_response = generate_fable_and_prompts(
@@ -22,27 +48,35 @@ def fable_generation_handler(world_description: str, main_character: str, age: i
         main_character=main_character,
         age=age,
         num_images=num_images,
+        profile=generation_profile,
     )
     logger.info(f"Generated fable and prompts: {open_ai_response}")
 
     # 2) Generate images using the optimized prompts, using previous image as reference for style consistency
+    #    unless the profile generates every image independently; stored images for near-identical prompts are reused
     illustrations = []
+    image_paths = []
     prev_image_b64 = None
-    os.makedirs("output_folder", exist_ok=True)
     
     for idx, prompt in enumerate(open_ai_response.image_prompts):
-        if idx == 0:
-            image_b64 = generate_illustration_image(prompt)
+        image_path = _find_similar_illustration(prompt, generation_profile)
+        if image_path is not None:
+            image_b64 = _load_base64_image(image_path)
         else:
-            image_bytes = base64.b64decode(prev_image_b64)
-            image_file = BytesIO(image_bytes)
-            image_file.name = f"image{idx-1}.png"
-            image_b64 = generate_illustration_image(prompt, reference_image=image_file)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        save_base64_image(image_b64, f"output_folder/image{idx}_{timestamp}.png")
+            if idx == 0 or generation_profile.consistency == "prompt_only":
+                image_b64 = generate_illustration_image(prompt, profile=generation_profile)
+            else:
+                image_bytes = base64.b64decode(prev_image_b64)
+                image_file = BytesIO(image_bytes)
+                image_file.name = f"image{idx-1}.png"
+                image_b64 = generate_illustration_image(prompt, reference_image=image_file, profile=generation_profile)
+            image_path = get_image_store().save(image_b64)
+            _index_illustration(prompt, image_path, generation_profile)
         illustrations.append({"prompt": prompt, "image": image_b64})
+        image_paths.append(image_path)
         prev_image_b64 = image_b64
 
+    _record_fable(world_description, main_character, age, num_images, open_ai_response, image_paths, generation_profile.name)
     return {
         "title": open_ai_response.title,
         "fable": open_ai_response.fable,
@@ -50,7 +84,110 @@ def fable_generation_handler(world_description: str, main_character: str, age: i
         "illustrations": illustrations
     }
 
-def save_base64_image(base64_str, filename):
-    with open(filename, "wb") as f:
-        f.write(base64.b64decode(base64_str))
-    logger.info(f"Saved image to {filename}")
\ No newline at end of file
+def fable_generation_stream_handler(world_description: str, main_character: str, age: int, num_images: int = 2, reuse_existing: bool = False, profile: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Same generation flow as fable_generation_handler, but with bounded memory:
+    each image is written to the image store as soon as it is generated and only its path is kept.
+    The previous image is re-read from disk as the style reference for the next one.
+    All OpenAI calls complete before this returns, so errors surface before any bytes are sent.
+    If reuse_existing is set and a close match is already stored, it is streamed instead.
+    Returns an iterator over the FableResponse JSON body.
+    """
+    generation_profile = get_generation_profile(profile)
+    if reuse_existing:
+        stored = _find_reusable_fable(world_description, main_character, age, num_images, generation_profile.name)
+        if stored is not None:
+            return iter_fable_json(
+                title=stored.title,
+                fable=stored.fable,
+                moral=stored.moral,
+                illustrations=list(zip(stored.image_prompts, stored.image_paths)),
+            )
+
+    open_ai_response = generate_fable_and_prompts(
+        world_description=world_description,
+        main_character=main_character,
+        age=age,
+        num_images=num_images,
+        profile=generation_profile,
+    )
+    logger.info(f"Generated fable and prompts: {open_ai_response}")
+
+    illustrations = []
+    prev_image_path = None
+
+    for idx, prompt in enumerate(open_ai_response.image_prompts):
+        image_path = _find_similar_illustration(prompt, generation_profile)
+        if image_path is None:
+            if idx == 0 or generation_profile.consistency == "prompt_only":
+                image_b64 = generate_illustration_image(prompt, profile=generation_profile)
+            else:
+                with open(prev_image_path, "rb") as image_file:
+                    image_b64 = generate_illustration_image(prompt, reference_image=image_file, profile=generation_profile)
+            image_path = get_image_store().save(image_b64)
+            del image_b64
+            _index_illustration(prompt, image_path, generation_profile)
+        illustrations.append((prompt, image_path))
+        prev_image_path = image_path
+
+    _record_fable(
+        world_description, main_character, age, num_images, open_ai_response,
+        [path for _, path in illustrations], generation_profile.name,
+    )
+    return iter_fable_json(
+        title=open_ai_response.title,
+        fable=open_ai_response.fable,
+        moral=open_ai_response.moral,
+        illustrations=illustrations,
+    )
+
+def _load_base64_image(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+def _find_reusable_fable(world_description: str, main_character: str, age: int, num_images: int, profile: str) -> Optional[StoredFable]:
+    """Look up a stored fable close enough to reuse; only fables whose images are all still on disk qualify."""
+    try:
+        stored = get_fable_store().find_reusable(world_description, main_character, age, num_images, profile)
+    except Exception as e:
+        logger.warning(f"Fable store lookup failed: {e}")
+        return None
+    if stored is None or not all(os.path.exists(path) for path in stored.image_paths):
+        return None
+    for path in stored.image_paths:
+        get_image_store().touch(path)
+    logger.info(f"Reusing stored fable {stored.id}: {stored.title}")
+    return stored
+
+def _record_fable(world_description: str, main_character: str, age: int, num_images: int, open_ai_response: OpenAiResponse, image_paths: List[str], profile: str) -> None:
+    """Record a generated fable; a store failure must not fail the request."""
+    try:
+        get_fable_store().save(world_description, main_character, age, num_images, open_ai_response, image_paths, profile)
+    except Exception as e:
+        logger.warning(f"Could not record fable in the store: {e}")
+
+def _find_similar_illustration(prompt: str, profile: GenerationProfile) -> Optional[str]:
+    """Path of a stored illustration whose prompt is close enough to reuse, if illustration reuse is enabled."""
+    if not settings.illustration_reuse_enabled:
+        return None
+    try:
+        match = get_illustration_index().find_similar(
+            prompt, profile.image_size, profile.image_quality, settings.illustration_reuse_threshold
+        )
+    except Exception as e:
+        logger.warning(f"Illustration index lookup failed: {e}")
+        return None
+    if match is None or not os.path.exists(match[1]):
+        return None
+    get_image_store().touch(match[1])
+    logger.info(f"Reusing illustration {match[1]} (similarity {match[2]:.2f}) for prompt: {prompt}")
+    return match[1]
+
+def _index_illustration(prompt: str, image_path: str, profile: GenerationProfile) -> None:
+    """Index a generated illustration for later reuse; an index failure must not fail the request."""
+    if not settings.illustration_reuse_enabled:
+        return
+    try:
+        get_illustration_index().add(prompt, image_path, profile.image_size, profile.image_quality)
+    except Exception as e:
+        logger.warning(f"Could not index illustration {image_path}: {e}")
@@ -0,0 +1,247 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Set
+import json
+import re
+import sqlite3
+import threading
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.types.fable_store import StoredFable
+from app.types.openai_response import OpenAiResponse, TokenUsage
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fables (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    world_description TEXT NOT NULL,
+    main_character TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    num_images INTEGER NOT NULL,
+    profile TEXT,
+    title TEXT NOT NULL,
+    fable TEXT NOT NULL,
+    moral TEXT NOT NULL,
+    image_prompts TEXT NOT NULL,
+    image_paths TEXT NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS fables_age ON fables (age);
+CREATE VIRTUAL TABLE IF NOT EXISTS fables_fts USING fts5(
+    world_description, main_character, title, fable, moral,
+    content='fables', content_rowid='id'
+);
+"""
+
+_COLUMNS = ", ".join(
+    f"fables.{column}" for column in (
+        "id", "created_at", "world_description", "main_character", "age", "num_images", "profile", "title", "fable",
+        "moral", "image_prompts", "image_paths", "prompt_tokens", "completion_tokens", "total_tokens",
+    )
+)
+
+# Candidates ranked by FTS relevance that find_reusable compares word for word
+_REUSE_CANDIDATES = 20
+
+_STOPWORDS = frozenset("a an the and or of on in at to with by for from into its his her their is are named".split())
+
+def _terms(text: str) -> Set[str]:
+    """Lowercase content words of a request field."""
+    return {word for word in re.findall(r"\w+", text.lower()) if word not in _STOPWORDS}
+
+def _jaccard(terms: Set[str], other: Set[str]) -> float:
+    return len(terms & other) / len(terms | other) if terms or other else 0.0
+
+def _match_terms(text: str) -> str:
+    """Turn free text into an FTS5 query that requires every word, quoting each so user input can't inject syntax."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+class FableStore:
+    """
+    Persistent SQLite store of generated fables with an FTS5 index over
+    the request parameters and story text.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(fables)")}
+            if "profile" not in columns:
+                # Stores created before profiles existed; their fables have no profile and are never reused
+                self._conn.execute("ALTER TABLE fables ADD COLUMN profile TEXT")
+
+    def save(
+        self,
+        world_description: str,
+        main_character: str,
+        age: int,
+        num_images: int,
+        response: OpenAiResponse,
+        image_paths: List[str],
+        profile: Optional[str] = None,
+    ) -> int:
+        """Record a generated fable, with the name of the generation profile that produced it, and return its id."""
+        # Unknown usage is stored as NULL rather than as zero tokens
+        usage = response.usage
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO fables (created_at, world_description, main_character, age, num_images, profile, title, "
+                "fable, moral, image_prompts, image_paths, prompt_tokens, completion_tokens, total_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    world_description,
+                    main_character,
+                    age,
+                    num_images,
+                    profile,
+                    response.title,
+                    response.fable,
+                    response.moral,
+                    json.dumps(response.image_prompts),
+                    json.dumps(image_paths),
+                    usage.prompt_tokens if usage else None,
+                    usage.completion_tokens if usage else None,
+                    usage.total_tokens if usage else None,
+                ),
+            )
+            fable_id = cursor.lastrowid
+            self._conn.execute(
+                "INSERT INTO fables_fts (rowid, world_description, main_character, title, fable, moral) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (fable_id, world_description, main_character, response.title, response.fable, response.moral),
+            )
+        return fable_id
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        world: Optional[str] = None,
+        character: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        num_images: Optional[int] = None,
+        profile: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[StoredFable]:
+        """
+        Find stored fables. Keywords in query must all appear somewhere in the fable or its request;
+        world and character words must appear in the respective request field.
+        Results are ordered by relevance when any text filter is given, otherwise newest first.
+        """
+        match_parts = []
+        if query and _match_terms(query):
+            match_parts.append(f"({_match_terms(query)})")
+        if world and _match_terms(world):
+            match_parts.append(f"world_description : ({_match_terms(world)})")
+        if character and _match_terms(character):
+            match_parts.append(f"main_character : ({_match_terms(character)})")
+
+        conditions, params = [], []
+        if match_parts:
+            conditions.append("fables_fts MATCH ?")
+            params.append(" AND ".join(match_parts))
+        if min_age is not None:
+            conditions.append("fables.age >= ?")
+            params.append(min_age)
+        if max_age is not None:
+            conditions.append("fables.age <= ?")
+            params.append(max_age)
+        if num_images is not None:
+            conditions.append("fables.num_images = ?")
+            params.append(num_images)
+        if profile is not None:
+            conditions.append("fables.profile = ?")
+            params.append(profile)
+
+        if match_parts:
+            sql = f"SELECT {_COLUMNS} FROM fables_fts JOIN fables ON fables.id = fables_fts.rowid"
+            order = "ORDER BY fables_fts.rank"
+        else:
+            sql = f"SELECT {_COLUMNS} FROM fables"
+            order = "ORDER BY fables.id DESC"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_stored_fable(row) for row in rows]
+
+    def find_reusable(
+        self, world_description: str, main_character: str, age: int, num_images: int, profile: str
+    ) -> Optional[StoredFable]:
+        """
+        Return the stored fable for the same number of images and generation profile, with age within
+        settings.fable_reuse_age_tolerance years, whose world and character words are each at least
+        settings.fable_reuse_min_similarity similar (Jaccard) to the request's, most similar first; or None.
+        """
+        world_terms, character_terms = _terms(world_description), _terms(main_character)
+        if not world_terms or not character_terms:
+            return None
+        tolerance = settings.fable_reuse_age_tolerance
+        match = "world_description : ({}) AND main_character : ({})".format(
+            " OR ".join(f'"{term}"' for term in world_terms), " OR ".join(f'"{term}"' for term in character_terms)
+        )
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM fables_fts JOIN fables ON fables.id = fables_fts.rowid "
+                "WHERE fables_fts MATCH ? AND fables.age BETWEEN ? AND ? AND fables.num_images = ? AND fables.profile = ? "
+                "ORDER BY fables_fts.rank LIMIT ?",
+                (match, age - tolerance, age + tolerance, num_images, profile, _REUSE_CANDIDATES),
+            ).fetchall()
+
+        best, best_similarity = None, settings.fable_reuse_min_similarity
+        for row in rows:
+            similarity = min(
+                _jaccard(world_terms, _terms(row["world_description"])),
+                _jaccard(character_terms, _terms(row["main_character"])),
+            )
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = row, similarity
+        return self._to_stored_fable(best) if best is not None else None
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _to_stored_fable(row: sqlite3.Row) -> StoredFable:
+        usage = None
+        if row["total_tokens"] is not None:
+            usage = TokenUsage(
+                prompt_tokens=row["prompt_tokens"],
+                completion_tokens=row["completion_tokens"],
+                total_tokens=row["total_tokens"],
+            )
+        return StoredFable(
+            id=row["id"],
+            created_at=row["created_at"],
+            world_description=row["world_description"],
+            main_character=row["main_character"],
+            age=row["age"],
+            num_images=row["num_images"],
+            profile=row["profile"],
+            title=row["title"],
+            fable=row["fable"],
+            moral=row["moral"],
+            image_prompts=json.loads(row["image_prompts"]),
+            image_paths=json.loads(row["image_paths"]),
+            usage=usage,
+        )
+
+@lru_cache()
+def get_fable_store() -> FableStore:
+    """Get the shared fable store instance."""
+    return FableStore(settings.fable_store_path)
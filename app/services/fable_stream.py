@@ -0,0 +1,36 @@
+from typing import Iterable, Iterator, Tuple
+import base64
+import json
+
+# Raw bytes read per chunk; a multiple of 3 so every chunk base64-encodes without padding
+STREAM_CHUNK_SIZE = 3 * 16 * 1024
+
+def iter_base64_file(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Stream the base64 encoding of a file chunk by chunk.
+    Only one chunk of the image is held in memory at a time.
+    """
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+
+def iter_fable_json(title: str, fable: str, moral: str, illustrations: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Incrementally serialize a fable as the FableResponse JSON document.
+    illustrations is an iterable of (prompt, image_path) pairs; each image is read from disk
+    and base64-encoded on the fly instead of being held in memory as a string.
+    """
+    yield b'{"title":' + json.dumps(title).encode()
+    yield b',"fable":' + json.dumps(fable).encode()
+    yield b',"moral":' + json.dumps(moral).encode()
+    yield b',"illustrations":['
+    for idx, (prompt, image_path) in enumerate(illustrations):
+        separator = b"," if idx else b""
+        yield separator + b'{"prompt":' + json.dumps(prompt).encode() + b',"image":"'
+        # The base64 alphabet needs no JSON escaping
+        yield from iter_base64_file(image_path)
+        yield b'"}'
+    yield b"]}"
@@ -0,0 +1,247 @@
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# MinHash signature length and its split into LSH bands; 16 bands of 4 rows make prompts
+# with Jaccard similarity 0.8 collide in some band with probability > 0.999
+NUM_PERM = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+# Document frequencies are too noisy to tell boilerplate from content in a small index
+_MIN_PROMPTS_FOR_DF = 20
+
+_STOPWORDS = frozenset(
+    "a an the and or of on in at to with by for from into onto over under its his her their is are".split()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS illustrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    image_size TEXT NOT NULL,
+    image_quality TEXT,
+    signature BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS illustrations_image_path ON illustrations (image_path);
+CREATE TABLE IF NOT EXISTS illustration_buckets (
+    bucket INTEGER NOT NULL,
+    illustration_id INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS illustration_buckets_bucket;
+CREATE INDEX IF NOT EXISTS illustration_buckets_bucket_id ON illustration_buckets (bucket, illustration_id);
+CREATE INDEX IF NOT EXISTS illustration_buckets_illustration_id ON illustration_buckets (illustration_id);
+CREATE TABLE IF NOT EXISTS shingle_df (
+    shingle INTEGER PRIMARY KEY,
+    df INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO index_stats (name, value) SELECT 'illustrations', COUNT(*) FROM illustrations;
+"""
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+def _signed(value: int) -> int:
+    """Shift an unsigned 64-bit hash to fit an SQLite INTEGER."""
+    return value - (1 << 63)
+
+def _shingles(prompt: str) -> List[bytes]:
+    """Content words of the prompt and their adjacent pairs."""
+    words = [w for w in re.findall(r"\w+", prompt.lower()) if w not in _STOPWORDS]
+    pairs = [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [s.encode() for s in words + pairs] or [prompt.lower().encode()]
+
+def _shingle_hashes(prompt: str) -> Set[int]:
+    return {_hash64(shingle) for shingle in _shingles(prompt)}
+
+def _minhash(hashes: Iterable[int]) -> List[int]:
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+def minhash_signature(prompt: str) -> List[int]:
+    """MinHash signature of the prompt's shingle set."""
+    return _minhash(_shingle_hashes(prompt))
+
+def estimated_similarity(signature: List[int], other: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(signature, other)) / NUM_PERM
+
+def _band_buckets(signature: List[int], image_size: str, image_quality: str) -> List[int]:
+    """
+    One LSH bucket key per band, signed to fit an SQLite INTEGER;
+    images of different sizes or qualities never share a bucket.
+    """
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        key = f"{image_size}:{image_quality}:{band}:" + ",".join(map(str, rows))
+        buckets.append(_signed(_hash64(key.encode())))
+    return buckets
+
+class IllustrationIndex:
+    """
+    Persistent index of generated illustrations by prompt, using MinHash signatures
+    and locality-sensitive hashing so lookups only compare a handful of candidate prompts.
+
+    Signatures and buckets cover every shingle, so they never change once stored. Candidates are then
+    compared by exact Jaccard similarity without the shingles found in more than
+    settings.illustration_max_shingle_df of the indexed prompts, such as a style suffix every prompt
+    shares, so boilerplate can't make unrelated prompts look alike. A lookup compares at most
+    settings.illustration_max_candidates prompts, preferring those sharing the most uncrowded bands.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(illustrations)")}
+            if "image_quality" not in columns:
+                # Entries indexed before quality was recorded are never matched again
+                self._conn.execute("ALTER TABLE illustrations ADD COLUMN image_quality TEXT")
+            if self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM shingle_df)").fetchone()[0]:
+                # Indexes created before document frequencies were tracked
+                for (prompt,) in self._conn.execute("SELECT prompt FROM illustrations").fetchall():
+                    self._count_shingles(_shingle_hashes(prompt), 1)
+
+    def _count_shingles(self, hashes: Set[int], delta: int) -> None:
+        self._conn.executemany(
+            "INSERT INTO shingle_df (shingle, df) VALUES (?, ?) ON CONFLICT (shingle) DO UPDATE SET df = df + ?",
+            [(_signed(h), delta, delta) for h in hashes],
+        )
+
+    def _document_frequencies(self, hashes: Set[int]) -> Tuple[int, Dict[int, int]]:
+        """Number of indexed prompts, and how many of them contain each of the given shingles."""
+        count = self._conn.execute("SELECT value FROM index_stats WHERE name = 'illustrations'").fetchone()[0]
+        keys = [_signed(h) for h in hashes]
+        rows = self._conn.execute(
+            f"SELECT shingle, df FROM shingle_df WHERE shingle IN ({','.join('?' * len(keys))})", keys
+        ).fetchall()
+        return count, {shingle + (1 << 63): df for shingle, df in rows}
+
+    @staticmethod
+    def _informative(hashes: Set[int], count: int, frequencies: Dict[int, int]) -> Set[int]:
+        """The shingles that don't occur in too large a share of the indexed prompts."""
+        if count < _MIN_PROMPTS_FOR_DF:
+            return hashes
+        max_df = settings.illustration_max_shingle_df * count
+        return {h for h in hashes if frequencies.get(h, 0) <= max_df}
+
+    def add(self, prompt: str, image_path: str, image_size: str, image_quality: str) -> int:
+        """Index a generated illustration and return its id."""
+        hashes = _shingle_hashes(prompt)
+        with self._lock, self._conn:
+            self._count_shingles(hashes, 1)
+            self._conn.execute("UPDATE index_stats SET value = value + 1 WHERE name = 'illustrations'")
+            signature = _minhash(hashes)
+            cursor = self._conn.execute(
+                "INSERT INTO illustrations (prompt, image_path, image_size, image_quality, signature) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (prompt, image_path, image_size, image_quality, array("Q", signature).tobytes()),
+            )
+            illustration_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO illustration_buckets (bucket, illustration_id) VALUES (?, ?)",
+                [(bucket, illustration_id) for bucket in _band_buckets(signature, image_size, image_quality)],
+            )
+        return illustration_id
+
+    def _candidate_ids(self, buckets: List[int]) -> List[int]:
+        """
+        Ids of at most settings.illustration_max_candidates illustrations sharing a bucket. Each bucket is read
+        up to that many entries, newest first; a bucket that fills up is crowded, typically by prompts sharing
+        boilerplate, so entries are ranked by shared uncrowded buckets first, then by shared crowded ones.
+        """
+        limit = settings.illustration_max_candidates
+        hits: Dict[int, List[int]] = {}
+        for bucket in buckets:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT illustration_id FROM illustration_buckets WHERE bucket = ? ORDER BY illustration_id DESC LIMIT ?",
+                (bucket, limit),
+            )]
+            crowded = len(ids) == limit
+            for illustration_id in ids:
+                counts = hits.setdefault(illustration_id, [0, 0])
+                counts[1 if crowded else 0] += 1
+        ranked = sorted(hits, key=lambda illustration_id: (*hits[illustration_id], illustration_id), reverse=True)
+        return ranked[:limit]
+
+    def find_similar(
+        self, prompt: str, image_size: str, image_quality: str, threshold: float
+    ) -> Optional[Tuple[str, str, float]]:
+        """
+        Find the indexed illustration of the same size and quality whose prompt is most similar to the given one.
+        Returns (prompt, image_path, similarity) if the Jaccard similarity of their informative shingles
+        reaches threshold, otherwise None.
+        """
+        hashes = _shingle_hashes(prompt)
+        with self._lock:
+            count, frequencies = self._document_frequencies(hashes)
+            query = self._informative(hashes, count, frequencies)
+            if not query:
+                return None
+            candidate_ids = self._candidate_ids(_band_buckets(_minhash(hashes), image_size, image_quality))
+            rows = self._conn.execute(
+                f"SELECT prompt, image_path FROM illustrations WHERE id IN ({','.join('?' * len(candidate_ids))}) "
+                "AND image_size = ? AND image_quality = ?",
+                candidate_ids + [image_size, image_quality],
+            ).fetchall()
+            candidates = [(candidate_prompt, image_path, _shingle_hashes(candidate_prompt)) for candidate_prompt, image_path in rows]
+            unseen = set().union(*(candidate_hashes for _, _, candidate_hashes in candidates)) - hashes
+            if unseen:
+                frequencies.update(self._document_frequencies(unseen)[1])
+
+        best = None
+        for candidate_prompt, image_path, candidate_hashes in candidates:
+            candidate = self._informative(candidate_hashes, count, frequencies)
+            similarity = len(query & candidate) / len(query | candidate)
+            if similarity >= threshold and (best is None or similarity > best[2]):
+                best = (candidate_prompt, image_path, similarity)
+        return best
+
+    def remove_image(self, image_path: str) -> None:
+        """Drop every entry that points to the given image."""
+        with self._lock, self._conn:
+            prompts = self._conn.execute(
+                "SELECT prompt FROM illustrations WHERE image_path = ?", (image_path,)
+            ).fetchall()
+            for (prompt,) in prompts:
+                self._count_shingles(_shingle_hashes(prompt), -1)
+            self._conn.execute("DELETE FROM shingle_df WHERE df <= 0")
+            self._conn.execute(
+                "DELETE FROM illustration_buckets WHERE illustration_id IN "
+                "(SELECT id FROM illustrations WHERE image_path = ?)",
+                (image_path,),
+            )
+            self._conn.execute("DELETE FROM illustrations WHERE image_path = ?", (image_path,))
+            self._conn.execute(
+                "UPDATE index_stats SET value = value - ? WHERE name = 'illustrations'", (len(prompts),)
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+@lru_cache()
+def get_illustration_index() -> IllustrationIndex:
+    """Get the shared illustration index instance."""
+    return IllustrationIndex(settings.illustration_index_path)
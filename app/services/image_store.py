@@ -0,0 +1,206 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.services.illustration_index import get_illustration_index
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_last_access ON images (last_access);
+"""
+
+_EVICTION_BATCH_SIZE = 500
+
+class ImageStore:
+    """
+    Content-addressed store for generated images.
+
+    Images are named by the SHA-256 of their bytes and sharded into subfolders by hash prefix,
+    so identical images are stored once and no folder grows without bound. An SQLite index
+    records each image's size and last access time; lookups, listing and eviction only query
+    the index and never scan the folder.
+
+    PNGs left at the top of the folder by earlier versions, which named images by timestamp, are
+    imported by import_legacy_images, which the app runs once at startup: each is moved to its
+    content-addressed path and indexed with its file modification time as last access, so it is
+    subject to eviction like any other image.
+    """
+
+    def __init__(self, root: str):
+        self._root = Path(root).resolve()
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._root / "index.db", check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def import_legacy_images(self) -> None:
+        """Move timestamp-named PNGs from the top of the folder into the store; duplicates are deleted."""
+        imported = 0
+        for legacy_path in self._root.glob("*.png"):
+            try:
+                image_bytes = legacy_path.read_bytes()
+                mtime = legacy_path.stat().st_mtime
+            except FileNotFoundError:
+                continue  # Imported by another worker
+            digest = hashlib.sha256(image_bytes).hexdigest()
+            path = self._root / digest[:2] / f"{digest}.png"
+            path.parent.mkdir(exist_ok=True)
+            try:
+                if path.exists():
+                    os.remove(legacy_path)
+                else:
+                    os.replace(legacy_path, path)
+            except FileNotFoundError:
+                continue
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO images (hash, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (digest, str(path), len(image_bytes), mtime, mtime),
+                )
+            imported += 1
+        if imported:
+            logger.info(f"Imported {imported} legacy images into the image store")
+
+    def save(self, image_b64: str) -> str:
+        """Store a base64-encoded PNG and return its path; an identical stored image is reused."""
+        image_bytes = base64.b64decode(image_b64)
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        path = self._root / digest[:2] / f"{digest}.png"
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM images WHERE hash = ?", (digest,)).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            self.touch(row[0])
+            logger.info(f"Image already stored at {row[0]}")
+            return row[0]
+
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (hash, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (digest, str(path), len(image_bytes), now, now),
+            )
+        logger.info(f"Saved image to {path}")
+        return str(path)
+
+    def touch(self, path: str) -> None:
+        """Mark an image as used, protecting it from eviction for a while."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE images SET last_access = ? WHERE path = ?", (time.time(), path))
+
+    def get(self, digest: str) -> Optional[str]:
+        """Path of the image with the given SHA-256 hex digest, if stored."""
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM images WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def list(self, limit: int = 100) -> List[str]:
+        """Paths of the most recently used images."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM images ORDER BY last_access DESC LIMIT ?", (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+
+    def evict(self, max_bytes: int, max_age_seconds: Optional[float] = None, min_idle_seconds: float = 0.0) -> List[str]:
+        """
+        Delete least recently used images until the store fits in max_bytes, and any image
+        not used for max_age_seconds. Images used within min_idle_seconds are never evicted,
+        so a response that is still streaming one of them can finish.
+        Returns the paths of the evicted images.
+        """
+        now = time.time()
+        excess = self.total_bytes() - max_bytes
+        evicted = []
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT hash, path, size, last_access FROM images WHERE last_access < ? "
+                    "ORDER BY last_access, rowid LIMIT ?",
+                    (now - min_idle_seconds, _EVICTION_BATCH_SIZE),
+                ).fetchall()
+            if not rows:
+                return evicted
+            for digest, path, size, last_access in rows:
+                too_old = max_age_seconds is not None and last_access < now - max_age_seconds
+                if excess <= 0 and not too_old:
+                    return evicted
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                with self._lock, self._conn:
+                    self._conn.execute("DELETE FROM images WHERE hash = ?", (digest,))
+                excess -= size
+                evicted.append(path)
+
+    def close(self) -> None:
+        self._conn.close()
+
+@lru_cache()
+def get_image_store() -> ImageStore:
+    """Get the shared image store instance."""
+    return ImageStore(settings.image_store_path)
+
+def import_legacy_images() -> None:
+    """Import images saved by earlier versions into the shared image store; blocking, run it off the event loop."""
+    get_image_store().import_legacy_images()
+
+def evict_images() -> List[str]:
+    """Run one eviction pass with the configured budget and drop evicted images from the illustration index."""
+    max_age_days = settings.image_store_max_age_days
+    evicted = get_image_store().evict(
+        max_bytes=settings.image_store_max_bytes,
+        max_age_seconds=max_age_days * 86400 if max_age_days is not None else None,
+        min_idle_seconds=settings.image_store_min_idle_seconds,
+    )
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} images from the image store")
+        if settings.illustration_reuse_enabled:
+            index = get_illustration_index()
+            for path in evicted:
+                index.remove_image(path)
+    return evicted
+
+async def run_image_eviction() -> None:
+    """
+    Background task: periodically evict images off the event loop.
+    When cancelled during a pass, waits for the worker thread to finish it, so no pass outlives the task.
+    """
+    while True:
+        eviction = asyncio.ensure_future(asyncio.to_thread(evict_images))
+        try:
+            await asyncio.shield(eviction)
+        except asyncio.CancelledError:
+            await asyncio.gather(eviction, return_exceptions=True)
+            raise
+        except Exception as e:
+            logger.warning(f"Image eviction failed: {e}")
+        await asyncio.sleep(settings.image_store_eviction_interval)
@@ -1,5 +1,7 @@
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
+from functools import lru_cache
 from pathlib import Path
+import httpx
 from jinja2 import Template
 from typing import Tuple, List, Optional, IO
 import base64
@@ -7,8 +9,12 @@ from io import BytesIO
 
 from app.core.config import get_settings
 from app.core.logging import get_logger
+from app.core.profiles import get_generation_profile
+from app.core.readiness import get_readiness_monitor
 from app.prompts.user_prompt import render_user_prompt
-from app.types.openai_response import OpenAiResponse
+from app.services.reference_image import prepare_reference_image
+from app.types.openai_response import OpenAiResponse, TokenUsage
+from app.types.generation_profile import GenerationProfile
 
 settings = get_settings()
 logger = get_logger(__name__)
@@ -18,56 +24,101 @@ def _load_prompt(name: str) -> str:
     """Load a prompt from the prompts directory."""
     return (PROMPTS_DIR / name).read_text()
 
+@lru_cache()
+def _get_http_client() -> httpx.Client:
+    """Shared HTTP connection pool for all OpenAI clients, bounded by settings.openai_max_connections."""
+    return DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_connections,
+        )
+    )
+
 def get_openai_client() -> OpenAI:
     """Get an instance of the OpenAI client."""
     if not settings.openai_api_key:
         return None
         
-    return OpenAI(api_key=settings.openai_api_key)
+    return OpenAI(api_key=settings.openai_api_key, http_client=_get_http_client())
+
+def _create_fable_completion(client: OpenAI, messages: List[dict], profile: GenerationProfile, max_tokens: int):
+    with get_readiness_monitor().upstream_call():
+        return client.chat.completions.create(
+            model=profile.chat_model,
+            messages=messages,
+            temperature=0.8,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            timeout=profile.request_timeout
+        )
 
-def generate_fable_and_prompts(world_description: str, main_character: str, age: int, num_images: int = 2) -> OpenAiResponse:
+def generate_fable_and_prompts(world_description: str, main_character: str, age: int, num_images: int = 2, profile: Optional[GenerationProfile] = None) -> OpenAiResponse:
     """
-    Uses GPT-4o to generate both a fable and optimized DALL-E prompts for key scenes.
+    Uses the profile's chat model to generate both a fable and optimized image prompts for key scenes.
+    The completion budget is scaled by the profile to the reader's age and the number of images;
+    a completion cut off by it is retried once with the profile's cap, then rejected with a ValueError.
     Returns the fable text and a list of image prompts.
     """
+    profile = profile or get_generation_profile()
     client = get_openai_client()
     messages = [
         {"role": "system", "content": _load_prompt("system.txt")},
         {"role": "user", "content": render_user_prompt(age, world_description, main_character, num_images)}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=messages,
-        temperature=0.8,
-        max_tokens=1000,
-        response_format={"type": "json_object"}
-    )
+    max_tokens = profile.max_tokens(age, num_images)
+    response = _create_fable_completion(client, messages, profile, max_tokens)
+    usage = [response.usage]
+    if response.choices[0].finish_reason == "length" and max_tokens < profile.max_tokens_cap:
+        # A cut-off completion is not valid JSON; retry once with the profile's full budget
+        logger.warning(f"Fable completion hit max_tokens={max_tokens}, retrying with {profile.max_tokens_cap}")
+        max_tokens = profile.max_tokens_cap
+        response = _create_fable_completion(client, messages, profile, max_tokens)
+        usage.append(response.usage)
+    if response.choices[0].finish_reason == "length":
+        raise ValueError(
+            f"Fable generation was cut off at the {max_tokens} token limit of the {profile.name} profile"
+        )
 
     full_response = response.choices[0].message.content.strip()
-    return OpenAiResponse.model_validate_json(full_response)
+    result = OpenAiResponse.model_validate_json(full_response)
+    if all(attempt is not None for attempt in usage):
+        result.usage = TokenUsage(
+            prompt_tokens=sum(attempt.prompt_tokens for attempt in usage),
+            completion_tokens=sum(attempt.completion_tokens for attempt in usage),
+            total_tokens=sum(attempt.total_tokens for attempt in usage),
+        )
+    return result
 
 
-def generate_illustration_image(prompt: str, reference_image: Optional[IO] = None) -> str:
+def generate_illustration_image(prompt: str, reference_image: Optional[IO] = None, profile: Optional[GenerationProfile] = None) -> str:
     """
-    Calls GPT Image (gpt-image-1) to generate an image for the given prompt.
-    If reference_image is provided, uses it as a style reference (edit endpoint).
+    Calls GPT Image (gpt-image-1) to generate an image for the given prompt,
+    at the quality and size of the generation profile.
+    If reference_image is provided, uses it as a style reference (edit endpoint),
+    downscaled and recompressed by prepare_reference_image before upload.
     Returns a base64-encoded PNG image string.
     """
+    profile = profile or get_generation_profile()
     client = get_openai_client()
     if reference_image is not None:
-        image_file = BytesIO(reference_image.read())
-        image_file.name = f"image.png"
-        response = client.images.edit(
-            model="gpt-image-1",
-            image=image_file,
-            prompt=prompt,
-            size="1024x1024"
-        )
+        image_file = prepare_reference_image(reference_image.read())
+        with get_readiness_monitor().upstream_call():
+            response = client.images.edit(
+                model="gpt-image-1",
+                image=image_file,
+                prompt=prompt,
+                size=profile.image_size,
+                quality=profile.image_quality,
+                timeout=profile.request_timeout
+            )
     else:
-        response = client.images.generate(
-            model="gpt-image-1",
-            prompt=prompt,
-            size="1024x1024"
-        )
+        with get_readiness_monitor().upstream_call():
+            response = client.images.generate(
+                model="gpt-image-1",
+                prompt=prompt,
+                size=profile.image_size,
+                quality=profile.image_quality,
+                timeout=profile.request_timeout
+            )
     return response.data[0].b64_json 
\ No newline at end of file
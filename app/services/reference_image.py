@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from io import BytesIO
+from typing import Tuple
+import hashlib
+import threading
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it references are uploaded unchanged
+    Image = None
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+_cache: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _encode_reference(image_bytes: bytes, max_size: int, image_format: str, quality: int) -> Tuple[bytes, str]:
+    """
+    Downscale the image to fit within max_size x max_size and re-encode it in image_format.
+    Returns the encoded bytes and the file extension to upload them with.
+    Falls back to the original PNG bytes if Pillow is missing or the image cannot be decoded.
+    """
+    if Image is None:
+        return image_bytes, "png"
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            image.thumbnail((max_size, max_size))
+            if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = BytesIO()
+            image.save(output, format=image_format.upper(), quality=quality, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not prepare reference image, uploading it unchanged: {e}")
+        return image_bytes, "png"
+    return output.getvalue(), image_format
+
+def prepare_reference_image(image_bytes: bytes) -> BytesIO:
+    """
+    Prepare a style reference for the images.edit endpoint.
+    The image is downscaled and recompressed according to the reference_image_* settings.
+    Prepared references are cached by content hash, so repeated edits against the same
+    reference don't pay the encode cost again.
+    Returns a named file-like object ready to upload.
+    """
+    max_size = settings.reference_image_max_size
+    image_format = settings.reference_image_format
+    quality = settings.reference_image_quality
+    key = f"{hashlib.sha256(image_bytes).hexdigest()}:{max_size}:{image_format}:{quality}"
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    if cached is None:
+        cached = _encode_reference(image_bytes, max_size, image_format, quality)
+        logger.info(f"Prepared reference image: {len(image_bytes)} -> {len(cached[0])} bytes")
+        with _cache_lock:
+            _cache[key] = cached
+            while len(_cache) > settings.reference_image_cache_size:
+                _cache.popitem(last=False)
+
+    prepared_bytes, extension = cached
+    image_file = BytesIO(prepared_bytes)
+    image_file.name = f"image.{extension}"
+    return image_file
+
+def clear_reference_cache() -> None:
+    """Drop all cached prepared references."""
+    with _cache_lock:
+        _cache.clear()
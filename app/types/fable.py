@@ -1,6 +1,8 @@
 from typing import List, Optional
 from pydantic import BaseModel
 
+from app.types.generation_profile import ProfileName
+
 class FableRequest(BaseModel):
     """
     Request model for fable generation.
@@ -9,6 +11,8 @@ class FableRequest(BaseModel):
     main_character: str
     age: int
     num_images: Optional[int] = 2
+    reuse_existing: Optional[bool] = False
+    profile: Optional[ProfileName] = None
 
     class Config:
         json_schema_extra = {
@@ -16,7 +20,9 @@ class FableRequest(BaseModel):
                 "world_description": "A magical forest with talking trees and sparkling streams",
                 "main_character": "A wise old owl named Professor Hoot",
                 "age": 8,
-                "num_images": 2
+                "num_images": 2,
+                "reuse_existing": False,
+                "profile": "balanced"
             }
         }
 
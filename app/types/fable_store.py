@@ -0,0 +1,50 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+from app.types.openai_response import TokenUsage
+
+class StoredFable(BaseModel):
+    """
+    A previously generated fable together with the request that produced it.
+    """
+    id: int
+    created_at: str
+    world_description: str
+    main_character: str
+    age: int
+    num_images: int
+    profile: Optional[str] = None
+    title: str
+    fable: str
+    moral: str
+    image_prompts: List[str]
+    image_paths: List[str] = Field(default_factory=list, exclude=True)
+    usage: Optional[TokenUsage] = None
+
+class FableSearchResponse(BaseModel):
+    """
+    Response model for fable search.
+    """
+    results: List[StoredFable]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": [
+                    {
+                        "id": 1,
+                        "created_at": "2025-05-01T12:00:00",
+                        "world_description": "A magical forest with talking trees and sparkling streams",
+                        "main_character": "A wise old owl named Professor Hoot",
+                        "age": 8,
+                        "num_images": 2,
+                        "profile": "balanced",
+                        "title": "The Wise Old Owl",
+                        "fable": "Once upon a time in a magical forest...",
+                        "moral": "Always be kind to others",
+                        "image_prompts": ["A wise owl sitting on a branch in a magical forest at sunset"],
+                        "usage": {"prompt_tokens": 350, "completion_tokens": 420, "total_tokens": 770}
+                    }
+                ]
+            }
+        }
@@ -0,0 +1,32 @@
+from typing import Literal, Optional
+from pydantic import BaseModel
+
+ProfileName = Literal["fast", "balanced", "premium"]
+
+class GenerationProfile(BaseModel):
+    """
+    Model, budget and image settings used for one fable generation.
+
+    consistency selects how illustrations are kept visually consistent:
+    "reference" passes the previous image to the edit endpoint, "prompt_only"
+    generates every image independently from its prompt.
+    image_quality "auto" leaves the quality choice to the Images API, as when it is not passed.
+    """
+    name: ProfileName
+    chat_model: str
+    base_max_tokens: int
+    max_tokens_per_age_year: int
+    max_tokens_per_image: int
+    min_max_tokens: int = 0
+    max_tokens_cap: int
+    image_quality: Literal["low", "medium", "high", "auto"]
+    image_size: Literal["1024x1024", "1536x1024", "1024x1536", "auto"]
+    consistency: Literal["reference", "prompt_only"]
+    request_timeout: float
+
+    def max_tokens(self, age: int, num_images: Optional[int]) -> int:
+        """Completion budget: older readers get longer fables, and every image needs a prompt."""
+        if num_images is None:
+            num_images = 2  # FableRequest's default
+        budget = self.base_max_tokens + self.max_tokens_per_age_year * age + self.max_tokens_per_image * num_images
+        return min(max(budget, self.min_max_tokens), self.max_tokens_cap)
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 class HealthResponse(BaseModel):
@@ -11,4 +12,29 @@ class HealthResponse(BaseModel):
             "example": {
                 "status": "healthy"
             }
-        } 
\ No newline at end of file
+        }
+
+class ReadinessResponse(BaseModel):
+    """
+    Response model for readiness probe endpoint.
+    """
+    status: str
+    loop_lag_ms: float
+    in_flight_requests: int
+    queue_depth: int
+    generations_in_progress: int
+    pool_utilization: float
+    reasons: List[str]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "status": "ready",
+                "loop_lag_ms": 1.2,
+                "in_flight_requests": 3,
+                "queue_depth": 0,
+                "generations_in_progress": 3,
+                "pool_utilization": 0.15,
+                "reasons": []
+            }
+        }
@@ -1,8 +1,14 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
 
 class OpenAiResponse(BaseModel):
     title: str
     fable: str
     moral: str
-    image_prompts: List[str] 
\ No newline at end of file
+    image_prompts: List[str]
+    usage: Optional[TokenUsage] = None
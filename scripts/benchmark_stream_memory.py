@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare peak Python memory of the buffered and streamed fable response paths with tracemalloc.
+
+Both runs go through the real service handlers, fable store and image store; only the OpenAI calls
+are replaced, by a canned fable and random base64 payloads of a typical gpt-image-1 PNG size, so the
+numbers reflect what the service itself holds while building and sending the response body.
+The buffered path serializes the handler's result as FableResponse, as /generate_fable does;
+the streamed path sends the handler's body through a StreamingResponse to a sink, as
+/generate_fable/stream does.
+"""
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.responses import StreamingResponse
+
+from app.services.fable_service import fable_generation_handler, fable_generation_stream_handler
+from app.services.fable_store import FableStore
+from app.services.image_store import ImageStore
+from app.types.fable import FableResponse
+from app.types.openai_response import OpenAiResponse
+
+IMAGE_SIZE = 1_500_000  # bytes of a typical 1024x1024 PNG
+FABLE_TEXT = "Once upon a time, in a magical forest... " * 50
+REQUEST = {"world_description": "A magical forest", "main_character": "A wise old owl", "age": 7}
+
+def fake_fable(world_description, main_character, age, num_images=2, profile=None) -> OpenAiResponse:
+    return OpenAiResponse(
+        title="Title",
+        fable=FABLE_TEXT,
+        moral="Moral",
+        image_prompts=[f"Scene {idx}" for idx in range(num_images)],
+    )
+
+def fake_image_b64(prompt, reference_image=None, profile=None) -> str:
+    """Base64 string as returned by the SDK for one image."""
+    return base64.b64encode(os.urandom(IMAGE_SIZE)).decode("utf-8")
+
+def buffered_response(num_images: int) -> int:
+    """/generate_fable: build the whole result, validate it and encode the body."""
+    result = fable_generation_handler(**REQUEST, num_images=num_images)
+    body = FableResponse(**result).model_dump_json().encode("utf-8")
+    return len(body)
+
+def streamed_response(num_images: int) -> int:
+    """/generate_fable/stream: send the handler's body through a StreamingResponse, discarding each chunk."""
+    response = StreamingResponse(fable_generation_stream_handler(**REQUEST, num_images=num_images),
+                                 media_type="application/json")
+    size = 0
+
+    async def receive():
+        await asyncio.Event().wait()  # The client never disconnects
+
+    async def send(message):
+        nonlocal size
+        size += len(message.get("body", b""))
+
+    asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+    return size
+
+def measure_peak(fn, *args) -> int:
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def main():
+    print(f"{'images':>6} {'buffered MiB':>14} {'streamed MiB':>14}")
+    for num_images in (1, 2, 4, 6):
+        with tempfile.TemporaryDirectory() as folder:
+            image_store = ImageStore(os.path.join(folder, "images"))
+            fable_store = FableStore(os.path.join(folder, "fables.db"))
+            with patch("app.services.fable_service.generate_fable_and_prompts", side_effect=fake_fable), \
+                 patch("app.services.fable_service.generate_illustration_image", side_effect=fake_image_b64), \
+                 patch("app.services.fable_service.get_image_store", return_value=image_store), \
+                 patch("app.services.fable_service.get_fable_store", return_value=fable_store):
+                buffered_peak = measure_peak(buffered_response, num_images)
+                streamed_peak = measure_peak(streamed_response, num_images)
+            image_store.close()
+            fable_store.close()
+        print(f"{num_images:>6} {buffered_peak / 2**20:>14.1f} {streamed_peak / 2**20:>14.1f}")
+
+if __name__ == "__main__":
+    main()
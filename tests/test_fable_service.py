@@ -1,22 +1,26 @@
 import pytest
 from unittest.mock import patch, MagicMock, call
-from app.services.fable_service import fable_generation_handler
+from app.services.fable_service import fable_generation_handler, fable_generation_stream_handler
 from app.types.openai_response import OpenAiResponse # Corrected import path
+from app.types.fable_store import StoredFable
+from app.core.profiles import GENERATION_PROFILES
+from app.services.image_store import ImageStore
 import base64
+import json
 
+@patch("app.services.fable_service.get_fable_store")
 @patch("app.services.fable_service.generate_fable_and_prompts")
 @patch("app.services.fable_service.generate_illustration_image")
-@patch("app.services.fable_service.save_base64_image")
-@patch("app.services.fable_service.os.makedirs") # Mock makedirs
+@patch("app.services.fable_service.get_image_store")
 @patch("app.services.fable_service.BytesIO") # Mock BytesIO if needed for reference image handling
 @patch("app.services.fable_service.base64.b64decode") # Mock b64decode for reference image handling
 def test_fable_generation_handler(
     mock_b64decode,
     mock_bytesio,
-    mock_makedirs,
-    mock_save_image,
+    mock_get_image_store,
     mock_gen_image,
-    mock_gen_fable
+    mock_gen_fable,
+    mock_get_store
 ):
     # given
     world = "Enchanted Forest"
@@ -26,6 +30,7 @@ def test_fable_generation_handler(
 
     # Use the actual type for mocking
     mock_fable_response = OpenAiResponse(
+        title="The Brave Fox",
         fable="The fox went on an adventure...",
         moral="Bravery leads to discovery.",
         image_prompts=["Fox in forest", "Fox finds a treasure"]
@@ -36,6 +41,8 @@ def test_fable_generation_handler(
     mock_image_1_b64 = base64.b64encode(b'image1_data').decode('utf-8')
     mock_image_2_b64 = base64.b64encode(b'image2_data').decode('utf-8')
     mock_gen_image.side_effect = [mock_image_1_b64, mock_image_2_b64]
+    mock_save_image = mock_get_image_store.return_value.save
+    mock_save_image.side_effect = ["output_folder/ab/ab01.png", "output_folder/cd/cd02.png"]
 
     # Mock BytesIO return value needs a 'name' attribute for the handler logic
     mock_file_object = MagicMock()
@@ -50,13 +57,11 @@ def test_fable_generation_handler(
         world_description=world,
         main_character=char,
         age=age,
-        num_images=num_images
+        num_images=num_images,
+        profile=GENERATION_PROFILES["balanced"]
     )
 
-    # 2. Check if directory creation was attempted
-    mock_makedirs.assert_called_once_with("output_folder", exist_ok=True)
-
-    # 3. Check image generation calls
+    # 2. Check image generation calls
     assert mock_gen_image.call_count == 2
     calls = mock_gen_image.call_args_list
     # First call without reference image
@@ -69,16 +74,19 @@ def test_fable_generation_handler(
     calls[1].assert_called_with("Fox finds a treasure", reference_image=mock_file_object)
 
 
-    # 4. Check image saving calls (ignore timestamp in filename check)
-    assert mock_save_image.call_count == 2
-    save_calls = mock_save_image.call_args_list
-    assert save_calls[0][0][0] == mock_image_1_b64
-    assert save_calls[0][0][1].startswith("output_folder/image0_")
-    assert save_calls[1][0][0] == mock_image_2_b64
-    assert save_calls[1][0][1].startswith("output_folder/image1_")
+    # 3. Check images were saved to the image store
+    assert mock_save_image.call_args_list == [call(mock_image_1_b64), call(mock_image_2_b64)]
+
+    # 4. Check the fable was recorded in the store with its image paths and profile
+    mock_get_store.return_value.save.assert_called_once()
+    save_args = mock_get_store.return_value.save.call_args[0]
+    assert save_args[:5] == (world, char, age, num_images, mock_fable_response)
+    assert save_args[5] == ["output_folder/ab/ab01.png", "output_folder/cd/cd02.png"]
+    assert save_args[6] == "balanced"
 
     # 5. Check the final returned structure
     expected_result = {
+        "title": mock_fable_response.title,
         "fable": mock_fable_response.fable,
         "moral": mock_fable_response.moral,
         "illustrations": [
@@ -86,4 +94,186 @@ def test_fable_generation_handler(
             {"prompt": "Fox finds a treasure", "image": mock_image_2_b64}
         ]
     }
-    assert result == expected_result 
\ No newline at end of file
+    assert result == expected_result 
+
+@patch("app.services.fable_service.get_image_store")
+@patch("app.services.fable_service.get_fable_store")
+@patch("app.services.fable_service.generate_fable_and_prompts")
+@patch("app.services.fable_service.generate_illustration_image")
+def test_fable_generation_stream_handler(mock_gen_image, mock_gen_fable, mock_get_store, mock_get_image_store, tmp_path):
+    # given
+    image_store = ImageStore(str(tmp_path / "images"))
+    mock_get_image_store.return_value = image_store
+    mock_gen_fable.return_value = OpenAiResponse(
+        title="The Brave Fox",
+        fable="The fox went on an adventure...",
+        moral="Bravery leads to discovery.",
+        image_prompts=["Fox in forest", "Fox finds a treasure"]
+    )
+    mock_image_1_b64 = base64.b64encode(b'image1_data').decode('utf-8')
+    mock_image_2_b64 = base64.b64encode(b'image2_data').decode('utf-8')
+    reference_images = []
+
+    def fake_generate(prompt, reference_image=None, profile=None):
+        if reference_image is not None:
+            reference_images.append(reference_image.read())
+            return mock_image_2_b64
+        return mock_image_1_b64
+    mock_gen_image.side_effect = fake_generate
+
+    # when
+    body = b"".join(fable_generation_stream_handler("Enchanted Forest", "Brave Fox", 7, 2))
+
+    # then
+    # The second image uses the first one, re-read from disk, as its style reference
+    assert reference_images == [b'image1_data']
+    assert len(image_store.list()) == 2
+    mock_get_store.return_value.save.assert_called_once()
+    assert json.loads(body) == {
+        "title": "The Brave Fox",
+        "fable": "The fox went on an adventure...",
+        "moral": "Bravery leads to discovery.",
+        "illustrations": [
+            {"prompt": "Fox in forest", "image": mock_image_1_b64},
+            {"prompt": "Fox finds a treasure", "image": mock_image_2_b64}
+        ]
+    }
+
+@patch("app.services.fable_service.get_image_store")
+@patch("app.services.fable_service.get_fable_store")
+@patch("app.services.fable_service.generate_fable_and_prompts")
+@patch("app.services.fable_service.generate_illustration_image")
+def test_fable_generation_handler_reuses_stored_fable(mock_gen_image, mock_gen_fable, mock_get_store, mock_get_image_store, tmp_path):
+    # given
+    image_path = tmp_path / "image0.png"
+    image_path.write_bytes(b'stored_image')
+    mock_get_store.return_value.find_reusable.return_value = StoredFable(
+        id=1,
+        created_at="2025-05-01T12:00:00",
+        world_description="Enchanted Forest",
+        main_character="Brave Fox",
+        age=7,
+        num_images=1,
+        title="The Brave Fox",
+        fable="The fox went on an adventure...",
+        moral="Bravery leads to discovery.",
+        image_prompts=["Fox in forest"],
+        image_paths=[str(image_path)]
+    )
+
+    # when
+    result = fable_generation_handler("Enchanted Forest", "Brave Fox", 7, 1, reuse_existing=True)
+
+    # then
+    mock_get_store.return_value.find_reusable.assert_called_once_with("Enchanted Forest", "Brave Fox", 7, 1, "balanced")
+    mock_gen_fable.assert_not_called()
+    mock_gen_image.assert_not_called()
+    mock_get_image_store.return_value.touch.assert_called_once_with(str(image_path))
+    assert result == {
+        "title": "The Brave Fox",
+        "fable": "The fox went on an adventure...",
+        "moral": "Bravery leads to discovery.",
+        "illustrations": [{"prompt": "Fox in forest", "image": base64.b64encode(b'stored_image').decode('utf-8')}]
+    }
+
+@patch("app.services.fable_service.get_fable_store")
+@patch("app.services.fable_service.generate_fable_and_prompts")
+def test_fable_generation_handler_skips_reuse_when_images_are_missing(mock_gen_fable, mock_get_store):
+    # given
+    mock_get_store.return_value.find_reusable.return_value = StoredFable(
+        id=1,
+        created_at="2025-05-01T12:00:00",
+        world_description="Enchanted Forest",
+        main_character="Brave Fox",
+        age=7,
+        num_images=1,
+        title="The Brave Fox",
+        fable="The fox went on an adventure...",
+        moral="Bravery leads to discovery.",
+        image_prompts=["Fox in forest"],
+        image_paths=["output_folder/does_not_exist.png"]
+    )
+    mock_gen_fable.side_effect = Exception("generation called")
+
+    # when / then
+    with pytest.raises(Exception, match="generation called"):
+        fable_generation_handler("Enchanted Forest", "Brave Fox", 7, 1, reuse_existing=True)
+
+@patch("app.services.fable_service.get_fable_store")
+@patch("app.services.fable_service.generate_fable_and_prompts")
+@patch("app.services.fable_service.generate_illustration_image")
+@patch("app.services.fable_service.get_image_store")
+def test_fable_generation_handler_fast_profile_skips_reference_chain(
+    mock_get_image_store,
+    mock_gen_image,
+    mock_gen_fable,
+    mock_get_store
+):
+    # given
+    mock_gen_fable.return_value = OpenAiResponse(
+        title="The Brave Fox",
+        fable="The fox went on an adventure...",
+        moral="Bravery leads to discovery.",
+        image_prompts=["Fox in forest", "Fox finds a treasure"]
+    )
+    mock_gen_image.return_value = base64.b64encode(b'image_data').decode('utf-8')
+    fast = GENERATION_PROFILES["fast"]
+
+    # when
+    fable_generation_handler("Enchanted Forest", "Brave Fox", 7, 2, profile="fast")
+
+    # then
+    assert mock_gen_fable.call_args.kwargs["profile"] == fast
+    assert mock_gen_image.call_args_list == [
+        call("Fox in forest", profile=fast),
+        call("Fox finds a treasure", profile=fast)
+    ]
+
+def test_fable_generation_handler_rejects_unknown_profile():
+    with pytest.raises(ValueError, match="Unknown generation profile"):
+        fable_generation_handler("Enchanted Forest", "Brave Fox", 7, 2, profile="turbo")
+
+@patch("app.services.fable_service.get_image_store")
+@patch("app.services.fable_service.get_illustration_index")
+@patch("app.services.fable_service.get_fable_store")
+@patch("app.services.fable_service.generate_fable_and_prompts")
+@patch("app.services.fable_service.generate_illustration_image")
+def test_fable_generation_stream_handler_reuses_similar_illustration(
+    mock_gen_image, mock_gen_fable, mock_get_store, mock_get_index, mock_get_image_store, tmp_path, monkeypatch
+):
+    # given
+    mock_get_image_store.return_value = ImageStore(str(tmp_path / "images"))
+    monkeypatch.setattr("app.services.fable_service.settings.illustration_reuse_enabled", True)
+    stored_image = tmp_path / "owl.png"
+    stored_image.write_bytes(b'stored_owl')
+    mock_gen_fable.return_value = OpenAiResponse(
+        title="The Wise Owl",
+        fable="The owl shared its wisdom...",
+        moral="Wisdom lights the way.",
+        image_prompts=["A wise old owl on a glowing tree", "The owl teaching forest animals"]
+    )
+    mock_get_index.return_value.find_similar.side_effect = [
+        ("A wise old owl perched on a glowing tree", str(stored_image), 0.9),
+        None
+    ]
+    reference_images = []
+
+    def fake_generate(prompt, reference_image=None, profile=None):
+        reference_images.append(reference_image.read())
+        return base64.b64encode(b'new_image').decode('utf-8')
+    mock_gen_image.side_effect = fake_generate
+
+    # when
+    body = json.loads(b"".join(fable_generation_stream_handler("Magic Forest", "Wise Owl", 8, 2)))
+
+    # then
+    # Only the second image is generated, using the reused one as its style reference, and only it is indexed
+    assert reference_images == [b'stored_owl']
+    assert [i["image"] for i in body["illustrations"]] == [
+        base64.b64encode(b'stored_owl').decode('utf-8'),
+        base64.b64encode(b'new_image').decode('utf-8')
+    ]
+    mock_get_index.return_value.add.assert_called_once()
+    assert mock_get_index.return_value.add.call_args[0][0] == "The owl teaching forest animals"
+    assert mock_get_index.return_value.add.call_args[0][2:] == ("1024x1024", "auto")
+    assert mock_get_index.return_value.find_similar.call_args[0][1:3] == ("1024x1024", "auto")
@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+from app.services.fable_store import FableStore
+from app.types.openai_response import OpenAiResponse, TokenUsage
+
+@pytest.fixture
+def store():
+    fable_store = FableStore(":memory:")
+    yield fable_store
+    fable_store.close()
+
+def _response(title: str, fable: str = "Once upon a time...", usage: TokenUsage = None) -> OpenAiResponse:
+    return OpenAiResponse(
+        title=title,
+        fable=fable,
+        moral="Kindness matters.",
+        image_prompts=["Scene one", "Scene two"],
+        usage=usage
+    )
+
+def test_save_and_search_by_keywords(store):
+    # given
+    usage = TokenUsage(prompt_tokens=300, completion_tokens=400, total_tokens=700)
+    store.save("A magical forest", "Professor Hoot the owl", 8, 2,
+               _response("The Wise Owl", "The owl shared acorns with everyone.", usage), ["a.png", "b.png"])
+    store.save("An underwater city", "A curious octopus", 6, 2,
+               _response("The Octopus", "The octopus explored the reef."), ["c.png", "d.png"])
+
+    # when
+    results = store.search(query="acorns")
+
+    # then
+    assert len(results) == 1
+    stored = results[0]
+    assert stored.title == "The Wise Owl"
+    assert stored.world_description == "A magical forest"
+    assert stored.image_prompts == ["Scene one", "Scene two"]
+    assert stored.image_paths == ["a.png", "b.png"]
+    assert stored.usage == usage
+
+def test_save_without_usage_stores_no_usage(store):
+    # given
+    store.save("A magical forest", "An owl", 7, 1, _response("Owl"), ["a.png"])
+
+    # when
+    results = store.search(query="owl")
+
+    # then
+    assert results[0].usage is None
+
+def test_search_by_world_character_and_age(store):
+    # given
+    store.save("A magical forest", "A brave fox", 5, 1, _response("Young Fox"), ["a.png"])
+    store.save("A magical forest", "A brave fox", 10, 1, _response("Older Fox"), ["b.png"])
+    store.save("A magical forest", "A sleepy bear", 10, 1, _response("Bear"), ["c.png"])
+    store.save("A desert", "A brave fox", 10, 1, _response("Desert Fox"), ["d.png"])
+
+    # when
+    results = store.search(world="forest", character="fox", min_age=8, max_age=12)
+
+    # then
+    assert [r.title for r in results] == ["Older Fox"]
+
+def test_search_without_filters_returns_newest_first(store):
+    # given
+    store.save("World", "Hero", 7, 1, _response("First"), ["a.png"])
+    store.save("World", "Hero", 7, 1, _response("Second"), ["b.png"])
+
+    # when
+    results = store.search(limit=1)
+
+    # then
+    assert [r.title for r in results] == ["Second"]
+
+def test_search_ignores_fts_syntax_in_user_input(store):
+    # given
+    store.save("A magical forest", "An owl", 7, 1, _response("Owl"), ["a.png"])
+
+    # when
+    results = store.search(query='owl"*(', world="magical)*:")
+
+    # then
+    assert [r.title for r in results] == ["Owl"]
+
+def test_find_reusable_requires_same_num_images_profile_and_close_age(store):
+    # given
+    store.save("A magical forest", "A wise old owl", 8, 2, _response("Owl"), ["a.png", "b.png"], "balanced")
+
+    # then
+    assert store.find_reusable("Magical forest", "wise old owl", 9, 2, "balanced").title == "Owl"
+    assert store.find_reusable("Magical forest", "wise old owl", 9, 2, "balanced").profile == "balanced"
+    assert store.find_reusable("Magical forest", "wise old owl", 12, 2, "balanced") is None
+    assert store.find_reusable("Magical forest", "wise old owl", 8, 3, "balanced") is None
+    assert store.find_reusable("Magical forest", "young owl", 8, 2, "balanced") is None
+    assert store.find_reusable("Magical forest", "wise old owl", 8, 2, "premium") is None
+
+def test_find_reusable_requires_similar_words_both_ways(store):
+    # given
+    store.save("A magical forest with talking trees", "A wise old owl named Professor Hoot", 8, 2,
+               _response("Owl"), ["a.png", "b.png"], "balanced")
+
+    # then
+    # The stored fable contains every requested word, but is about much more than was asked for
+    assert store.find_reusable("A forest", "owl", 8, 2, "balanced") is None
+    # A slightly longer request still matches the shorter stored fable
+    assert store.find_reusable("A magical forest with talking trees and streams", "Wise old owl Professor Hoot",
+                               8, 2, "balanced").title == "Owl"
+
+def test_existing_store_gains_profile_column(tmp_path):
+    # given
+    path = str(tmp_path / "fables.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE fables (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL, "
+        "world_description TEXT NOT NULL, main_character TEXT NOT NULL, age INTEGER NOT NULL, "
+        "num_images INTEGER NOT NULL, title TEXT NOT NULL, fable TEXT NOT NULL, moral TEXT NOT NULL, "
+        "image_prompts TEXT NOT NULL, image_paths TEXT NOT NULL, prompt_tokens INTEGER, "
+        "completion_tokens INTEGER, total_tokens INTEGER)"
+    )
+    conn.close()
+
+    # when
+    store = FableStore(path)
+    store.save("A magical forest", "An owl", 7, 1, _response("Owl"), ["a.png"], "fast")
+
+    # then
+    assert store.find_reusable("A magical forest", "An owl", 7, 1, "fast").title == "Owl"
+    store.close()
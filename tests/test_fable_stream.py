@@ -0,0 +1,47 @@
+import base64
+import json
+from app.services.fable_stream import iter_base64_file, iter_fable_json
+from app.types.fable import FableResponse
+
+def test_iter_base64_file_matches_full_encoding(tmp_path):
+    # given
+    data = bytes(range(256)) * 50
+    image_path = tmp_path / "image.png"
+    image_path.write_bytes(data)
+
+    # when
+    chunks = list(iter_base64_file(str(image_path), chunk_size=300))
+
+    # then
+    assert len(chunks) > 1
+    assert b"".join(chunks) == base64.b64encode(data)
+
+def test_iter_fable_json_produces_valid_fable_response(tmp_path):
+    # given
+    first_path = tmp_path / "image0.png"
+    first_path.write_bytes(b"image1_data")
+    second_path = tmp_path / "image1.png"
+    second_path.write_bytes(b"image2_data")
+
+    # when
+    body = b"".join(iter_fable_json(
+        title="The \"Brave\" Fox",
+        fable="The fox went on an adventure...\nThe end.",
+        moral="Bravery leads to discovery.",
+        illustrations=[("Fox in forest", str(first_path)), ("Fox finds a treasure", str(second_path))],
+    ))
+
+    # then
+    fable_response = FableResponse(**json.loads(body))
+    assert fable_response.title == "The \"Brave\" Fox"
+    assert fable_response.fable == "The fox went on an adventure...\nThe end."
+    assert [i.prompt for i in fable_response.illustrations] == ["Fox in forest", "Fox finds a treasure"]
+    assert fable_response.illustrations[0].image == base64.b64encode(b"image1_data").decode("utf-8")
+    assert fable_response.illustrations[1].image == base64.b64encode(b"image2_data").decode("utf-8")
+
+def test_iter_fable_json_without_illustrations():
+    # when
+    body = b"".join(iter_fable_json(title="T", fable="F", moral="M", illustrations=[]))
+
+    # then
+    assert json.loads(body) == {"title": "T", "fable": "F", "moral": "M", "illustrations": []}
@@ -0,0 +1,109 @@
+import itertools
+import pytest
+from unittest.mock import patch
+from app.services import illustration_index
+from app.services.illustration_index import IllustrationIndex, minhash_signature, estimated_similarity
+
+STYLE_SUFFIX = (
+    ", soft watercolor children's book illustration, pastel colors, gentle morning light,"
+    " highly detailed, whimsical storybook style"
+)
+
+@pytest.fixture
+def index():
+    illustration_index = IllustrationIndex(":memory:")
+    yield illustration_index
+    illustration_index.close()
+
+def test_signature_similarity_tracks_prompt_overlap():
+    # given
+    prompt = "A wise old owl perched on a glowing tree at night"
+
+    # then
+    assert estimated_similarity(minhash_signature(prompt), minhash_signature(prompt.upper() + ".")) == 1.0
+    assert estimated_similarity(minhash_signature(prompt), minhash_signature("A red fox running through snow")) < 0.2
+
+def test_find_similar_returns_near_duplicate(index):
+    # given
+    index.add("A wise old owl perched on a glowing tree at night", "output_folder/owl.png", "1024x1024", "medium")
+    index.add("A red fox running through a snowy field", "output_folder/fox.png", "1024x1024", "medium")
+
+    # when
+    match = index.find_similar("A wise old owl perched on the glowing tree at night", "1024x1024", "medium", 0.8)
+
+    # then
+    assert match is not None
+    prompt, image_path, similarity = match
+    assert prompt == "A wise old owl perched on a glowing tree at night"
+    assert image_path == "output_folder/owl.png"
+    assert similarity >= 0.8
+
+def test_find_similar_respects_threshold_size_and_quality(index):
+    # given
+    index.add("A wise old owl perched on a glowing tree at night", "output_folder/owl.png", "1024x1024", "medium")
+
+    # then
+    assert index.find_similar("A young owl flying over a dark lake", "1024x1024", "medium", 0.8) is None
+    assert index.find_similar("A wise old owl perched on a glowing tree at night", "1024x1536", "medium", 0.5) is None
+    assert index.find_similar("A wise old owl perched on a glowing tree at night", "1024x1024", "high", 0.5) is None
+
+def test_remove_image_drops_entries(index):
+    # given
+    index.add("A wise old owl perched on a glowing tree at night", "output_folder/owl.png", "1024x1024", "medium")
+
+    # when
+    index.remove_image("output_folder/owl.png")
+
+    # then
+    assert index.find_similar("A wise old owl perched on a glowing tree at night", "1024x1024", "medium", 0.5) is None
+
+def test_shared_style_suffix_does_not_make_prompts_similar(index):
+    # given
+    subjects = ["owl", "fox", "bear", "rabbit", "squirrel", "hedgehog", "deer", "turtle"]
+    actions = ["reading a map", "crossing a bridge", "picking berries", "building a nest", "watching the stars"]
+    places = ["under an old oak", "in a snowy meadow", "near a misty waterfall", "on a mossy hill", "inside a hollow log"]
+    for i, (subject, action, place) in enumerate(itertools.product(subjects, actions, places)):
+        index.add(f"A {subject} {action} {place}{STYLE_SUFFIX}", f"output_folder/{i}.png", "1024x1024", "medium")
+    fox = f"A brave fox fishing beside a glowing river{STYLE_SUFFIX}"
+    bear = f"A sleepy bear fishing beside a glowing river{STYLE_SUFFIX}"
+    for i in range(20):
+        index.add(fox, f"output_folder/fox{i}.png", "1024x1024", "medium")
+    assert estimated_similarity(minhash_signature(fox), minhash_signature(bear)) >= 0.8  # Boilerplate dominates
+
+    candidate_counts = []
+    candidate_ids = index._candidate_ids
+
+    def count_candidates(buckets):
+        candidates = candidate_ids(buckets)
+        candidate_counts.append(len(candidates))
+        return candidates
+
+    # when
+    with patch.object(illustration_index.settings, "illustration_max_candidates", 8), \
+         patch.object(index, "_candidate_ids", side_effect=count_candidates):
+        false_positive = index.find_similar(bear, "1024x1024", "medium", 0.8)
+        near_duplicate = index.find_similar(f"A brave fox fishing beside the glowing river{STYLE_SUFFIX}", "1024x1024", "medium", 0.8)
+
+    # then
+    assert false_positive is None
+    assert near_duplicate is not None and near_duplicate[0] == fox
+    assert candidate_counts[1] == 8  # 20 identical fox prompts share the lookup's buckets
+    assert max(candidate_counts) <= 8
+
+def test_prompt_indexed_before_boilerplate_became_frequent_is_still_found(index):
+    # given
+    owl = f"A wise old owl reading a map under an old oak{STYLE_SUFFIX}"
+    index.add(owl, "output_folder/owl.png", "1024x1024", "medium")
+    subjects = ["fox", "bear", "rabbit", "squirrel", "hedgehog", "deer", "turtle", "badger"]
+    actions = ["crossing a bridge", "picking berries", "building a nest", "watching the stars", "fishing"]
+    places = ["in a snowy meadow", "near a misty waterfall", "on a mossy hill", "inside a hollow log", "by the sea"]
+    for i, (subject, action, place) in enumerate(itertools.product(subjects, actions, places)):
+        index.add(f"A {subject} {action} {place}{STYLE_SUFFIX}", f"output_folder/{i}.png", "1024x1024", "medium")
+
+    # when
+    identical = index.find_similar(owl, "1024x1024", "medium", 0.8)
+    variant = index.find_similar(f"A wise young owl reading a map under an old oak{STYLE_SUFFIX}", "1024x1024", "medium", 0.5)
+
+    # then
+    assert identical == (owl, "output_folder/owl.png", 1.0)
+    assert variant is not None and variant[1] == "output_folder/owl.png"
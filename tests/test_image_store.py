@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import hashlib
+import os
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.services.image_store import ImageStore, evict_images, run_image_eviction
+
+@pytest.fixture
+def store(tmp_path):
+    image_store = ImageStore(str(tmp_path / "images"))
+    yield image_store
+    image_store.close()
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+def test_save_stores_image_by_content_hash(store, tmp_path):
+    # when
+    path = store.save(_b64(b"image_data"))
+
+    # then
+    with open(path, "rb") as f:
+        assert f.read() == b"image_data"
+    digest = path.rsplit("/", 1)[1].removesuffix(".png")
+    assert path.startswith(str(tmp_path / "images" / digest[:2]))
+    assert store.get(digest) == path
+    assert store.total_bytes() == len(b"image_data")
+
+def test_save_deduplicates_identical_images(store):
+    # when
+    first = store.save(_b64(b"image_data"))
+    second = store.save(_b64(b"image_data"))
+
+    # then
+    assert first == second
+    assert store.list() == [first]
+    assert store.total_bytes() == len(b"image_data")
+
+def test_evict_removes_least_recently_used_images(store):
+    # given
+    oldest = store.save(_b64(b"a" * 100))
+    middle = store.save(_b64(b"b" * 100))
+    newest = store.save(_b64(b"c" * 100))
+    store.touch(oldest)
+
+    # when
+    evicted = store.evict(max_bytes=150)
+
+    # then
+    assert evicted == [middle, newest]
+    assert store.list() == [oldest]
+    assert store.total_bytes() == 100
+
+def test_evict_removes_images_past_max_age_and_keeps_recently_used(store):
+    # given
+    path = store.save(_b64(b"image_data"))
+
+    # then
+    assert store.evict(max_bytes=0, min_idle_seconds=60) == []
+    time.sleep(0.01)
+    assert store.evict(max_bytes=10 ** 9, max_age_seconds=0.001) == [path]
+    assert store.list() == []
+
+def test_evict_images_drops_evicted_images_from_illustration_index(store):
+    # given
+    path = store.save(_b64(b"image_data"))
+
+    # when
+    with patch("app.services.image_store.get_image_store", return_value=store), \
+         patch("app.services.image_store.get_illustration_index") as mock_get_index, \
+         patch.multiple("app.services.image_store.settings", image_store_max_bytes=0,
+                        image_store_min_idle_seconds=0.0, illustration_reuse_enabled=True):
+        evicted = evict_images()
+
+    # then
+    assert evicted == [path]
+    mock_get_index.return_value.remove_image.assert_called_once_with(path)
+
+def test_import_legacy_images_moves_them_into_the_store(tmp_path):
+    # given
+    legacy = tmp_path / "image1_20250501_120000_000000.png"
+    duplicate = tmp_path / "image2_20250501_120000_000001.png"
+    legacy.write_bytes(b"legacy")
+    duplicate.write_bytes(b"legacy")
+    other = tmp_path / "image1_20250502_120000_000000.png"
+    other.write_bytes(b"other legacy")
+    os.utime(other, (1000.0, 1000.0))
+
+    store = ImageStore(str(tmp_path))
+    assert store.total_bytes() == 0  # Opening the store doesn't scan the folder
+
+    # when
+    store.import_legacy_images()
+
+    # then
+    legacy_path = store.get(hashlib.sha256(b"legacy").hexdigest())
+    other_path = store.get(hashlib.sha256(b"other legacy").hexdigest())
+    assert list(tmp_path.glob("*.png")) == []
+    assert open(legacy_path, "rb").read() == b"legacy"
+    assert store.total_bytes() == len(b"legacy") + len(b"other legacy")
+    # The oldest legacy image is evicted first
+    assert store.evict(max_bytes=len(b"legacy")) == [other_path]
+    store.close()
+
+@pytest.mark.asyncio
+@patch("app.services.image_store.evict_images")
+async def test_cancelled_eviction_task_waits_for_running_pass(mock_evict_images):
+    # given
+    started, release = threading.Event(), threading.Event()
+    finished = []
+
+    def slow_pass():
+        started.set()
+        release.wait(5)
+        finished.append(True)
+        return []
+
+    mock_evict_images.side_effect = slow_pass
+    task = asyncio.create_task(run_image_eviction())
+    await asyncio.to_thread(started.wait, 5)
+
+    # when
+    task.cancel()
+    await asyncio.sleep(0.05)
+    release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # then
+    assert finished == [True]
@@ -2,8 +2,10 @@ import pytest
 import pytest_asyncio # Import explicitly for the fixture decorator
 from httpx import AsyncClient, ASGITransport # Import ASGITransport
 from app.main import app  # Import your FastAPI app instance
+from app.core.readiness import get_readiness_monitor
 from app.types.fable import FableRequest, FableResponse, IllustrationResponse # Import IllustrationResponse
-from app.types.health import HealthResponse
+from app.types.health import HealthResponse, ReadinessResponse
+from app.types.fable_store import FableSearchResponse, StoredFable
 from unittest.mock import patch
 
 # Using pytest-asyncio for async tests
@@ -35,6 +37,7 @@ async def test_generate_fable_success(mock_handler, client: AsyncClient):
         num_images=1
     )
     mock_response = FableResponse(
+        title="The Brave Squirrel",
         fable="Once upon a time...", # Changed title to fable
         moral="Bravery comes in all sizes.",
         illustrations=[
@@ -54,7 +57,9 @@ async def test_generate_fable_success(mock_handler, client: AsyncClient):
         world_description="A magical forest",
         main_character="A brave squirrel",
         age=8,
-        num_images=1
+        num_images=1,
+        reuse_existing=False,
+        profile=None
     )
 
 @patch("app.main.fable_generation_handler")
@@ -91,4 +96,146 @@ async def test_generate_fable_generic_error(mock_handler, client: AsyncClient):
 
     # then
     assert response.status_code == 500
-    assert "Something went wrong" in response.json()["detail"] 
\ No newline at end of file
+    assert "Something went wrong" in response.json()["detail"] 
+
+@patch("app.main.fable_generation_stream_handler")
+async def test_generate_fable_stream_success(mock_handler, client: AsyncClient):
+    # given
+    request_data = FableRequest(
+        world_description="A magical forest",
+        main_character="A brave squirrel",
+        age=8,
+        num_images=1
+    )
+    mock_handler.return_value = iter([
+        b'{"title":"The Squirrel","fable":"Once upon a time...","moral":"Bravery comes in all sizes.",',
+        b'"illustrations":[{"prompt":"A brave squirrel","image":"aW1hZ2Ux"}]}',
+    ])
+
+    # when
+    response = await client.post("/generate_fable/stream", json=request_data.model_dump())
+
+    # then
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    fable_response = FableResponse(**response.json())
+    assert fable_response.title == "The Squirrel"
+    assert fable_response.illustrations[0].image == "aW1hZ2Ux"
+    mock_handler.assert_called_once_with(
+        world_description="A magical forest",
+        main_character="A brave squirrel",
+        age=8,
+        num_images=1,
+        reuse_existing=False,
+        profile=None
+    )
+
+@patch("app.main.fable_generation_stream_handler")
+async def test_generate_fable_stream_counts_in_flight_until_body_is_sent(mock_handler, client: AsyncClient):
+    # given
+    request_data = FableRequest(
+        world_description="A magical forest",
+        main_character="A brave squirrel",
+        age=8,
+        num_images=1
+    )
+    in_flight_while_streaming = []
+
+    def body():
+        yield b'{"title":"The Squirrel","fable":"Once upon a time...","moral":"Bravery comes in all sizes.",'
+        in_flight_while_streaming.append(get_readiness_monitor().in_flight_requests)
+        yield b'"illustrations":[]}'
+
+    mock_handler.return_value = body()
+
+    # when
+    response = await client.post("/generate_fable/stream", json=request_data.model_dump())
+
+    # then
+    assert response.status_code == 200
+    assert in_flight_while_streaming == [1]
+    assert get_readiness_monitor().in_flight_requests == 0
+
+@patch("app.main.fable_generation_stream_handler")
+async def test_generate_fable_stream_generic_error(mock_handler, client: AsyncClient):
+    # given
+    request_data = FableRequest(
+        world_description="An underwater city",
+        main_character="A curious octopus",
+        age=6,
+        num_images=1
+    )
+    mock_handler.side_effect = Exception("Something went wrong during generation.")
+
+    # when
+    response = await client.post("/generate_fable/stream", json=request_data.model_dump())
+
+    # then
+    assert response.status_code == 500
+    assert "Something went wrong" in response.json()["detail"]
+
+@patch("app.main.get_fable_store")
+async def test_search_fables(mock_get_store, client: AsyncClient):
+    # given
+    mock_get_store.return_value.search.return_value = [
+        StoredFable(
+            id=1,
+            created_at="2025-05-01T12:00:00",
+            world_description="A magical forest",
+            main_character="A wise old owl",
+            age=8,
+            num_images=1,
+            title="The Wise Owl",
+            fable="Once upon a time...",
+            moral="Wisdom lights the way.",
+            image_prompts=["An owl in a tree"],
+            image_paths=["output_folder/image0.png"]
+        )
+    ]
+
+    # when
+    response = await client.get("/fables/search", params={"q": "owl", "world": "forest", "min_age": 6, "max_age": 10})
+
+    # then
+    assert response.status_code == 200
+    search_response = FableSearchResponse(**response.json())
+    assert [r.title for r in search_response.results] == ["The Wise Owl"]
+    assert "image_paths" not in response.json()["results"][0]
+    mock_get_store.return_value.search.assert_called_once_with(
+        query="owl",
+        world="forest",
+        character=None,
+        min_age=6,
+        max_age=10,
+        limit=10
+    )
+
+async def test_readiness_check_ready(client: AsyncClient):
+    # when
+    response = await client.get("/health/ready")
+
+    # then
+    assert response.status_code == 200
+    readiness = ReadinessResponse(**response.json())
+    assert readiness.status == "ready"
+    assert readiness.in_flight_requests == 0
+
+@patch("app.main.get_readiness_monitor")
+async def test_readiness_check_not_ready(mock_get_monitor, client: AsyncClient):
+    # given
+    mock_get_monitor.return_value.snapshot.return_value = ReadinessResponse(
+        status="not_ready",
+        loop_lag_ms=900.0,
+        in_flight_requests=12,
+        queue_depth=0,
+        generations_in_progress=8,
+        pool_utilization=0.4,
+        reasons=["event loop lag 900ms exceeds 250ms"]
+    )
+
+    # when
+    response = await client.get("/health/ready")
+
+    # then
+    assert response.status_code == 503
+    assert response.json()["reasons"] == ["event loop lag 900ms exceeds 250ms"]
@@ -2,7 +2,8 @@ import pytest
 from unittest.mock import patch, MagicMock, ANY
 from app.services.openai_client import generate_fable_and_prompts, generate_illustration_image, get_openai_client
 from app.core.config import Settings
-from app.types.openai_response import OpenAiResponse
+from app.types.openai_response import OpenAiResponse, TokenUsage
+from app.core.profiles import GENERATION_PROFILES
 import json
 from io import BytesIO
 
@@ -41,12 +42,16 @@ def test_generate_fable_and_prompts_success(mock_settings, mock_openai_client, m
     
     # Mock the API response
     mock_response_content = OpenAiResponse(
+        title="Moon Explorer",
         fable="An astronaut explored the moon...",
         moral="Curiosity is key.",
         image_prompts=["Astronaut on moon surface"]
     )
     mock_api_response = MagicMock()
     mock_api_response.choices[0].message.content = mock_response_content.model_dump_json()
+    mock_api_response.usage.prompt_tokens = 120
+    mock_api_response.usage.completion_tokens = 340
+    mock_api_response.usage.total_tokens = 460
     mock_openai_client.chat.completions.create.return_value = mock_api_response
     
     mock_load_prompt, mock_render_prompt = mock_file_io
@@ -65,9 +70,11 @@ def test_generate_fable_and_prompts_success(mock_settings, mock_openai_client, m
         ],
         temperature=0.8,
         max_tokens=1000,
-        response_format={"type": "json_object"}
+        response_format={"type": "json_object"},
+        timeout=120.0
     )
-    assert result == mock_response_content
+    assert result.model_dump(exclude={"usage"}) == mock_response_content.model_dump(exclude={"usage"})
+    assert result.usage == TokenUsage(prompt_tokens=120, completion_tokens=340, total_tokens=460)
 
 # --- Tests for generate_illustration_image --- 
 
@@ -87,7 +94,9 @@ def test_generate_illustration_image_no_reference(mock_settings, mock_openai_cli
     mock_openai_client.images.generate.assert_called_once_with(
         model="gpt-image-1",
         prompt=prompt,
-        size="1024x1024"
+        size="1024x1024",
+        quality="auto",
+        timeout=120.0
     )
     assert result == expected_b64
     mock_openai_client.images.edit.assert_not_called() # Ensure edit endpoint wasn't called
@@ -116,10 +125,103 @@ def test_generate_illustration_image_with_reference(mock_settings, mock_openai_c
     assert call_args['model'] == "gpt-image-1"
     assert call_args['prompt'] == prompt
     assert call_args['size'] == "1024x1024"
+    assert call_args['quality'] == "auto"
     # Check the image arg passed to the API call
     assert isinstance(call_args['image'], BytesIO)
     assert call_args['image'].read() == reference_image_data # Check content
     assert call_args['image'].name == "image.png" # Check filename set internally
 
     assert result == expected_b64
-    mock_openai_client.images.generate.assert_not_called() # Ensure generate wasn't called 
\ No newline at end of file
+    mock_openai_client.images.generate.assert_not_called() # Ensure generate wasn't called 
+
+def test_generate_fable_and_prompts_uses_profile(mock_settings, mock_openai_client, mock_file_io):
+    # given
+    mock_api_response = MagicMock()
+    mock_api_response.choices[0].message.content = OpenAiResponse(
+        title="Moon Explorer",
+        fable="An astronaut explored the moon...",
+        moral="Curiosity is key.",
+        image_prompts=["Astronaut on moon surface", "Astronaut waves goodbye"]
+    ).model_dump_json()
+    mock_api_response.usage = None
+    mock_openai_client.chat.completions.create.return_value = mock_api_response
+
+    # when
+    generate_fable_and_prompts("Moon Base Alpha", "Curious Astronaut", 6, 2, profile=GENERATION_PROFILES["fast"])
+
+    # then
+    call_args = mock_openai_client.chat.completions.create.call_args[1]
+    assert call_args['model'] == "gpt-4.1-mini"
+    assert call_args['max_tokens'] == 600  # 350 + 15 * 6 + 60 * 2 raised to the fast profile's floor
+    assert call_args['timeout'] == 30.0
+
+def test_generate_illustration_image_uses_profile(mock_settings, mock_openai_client):
+    # given
+    mock_api_response = MagicMock()
+    mock_api_response.data[0].b64_json = "base64_encoded_image_data"
+    mock_openai_client.images.generate.return_value = mock_api_response
+
+    # when
+    generate_illustration_image("A colorful nebula", profile=GENERATION_PROFILES["premium"])
+
+    # then
+    mock_openai_client.images.generate.assert_called_once_with(
+        model="gpt-image-1",
+        prompt="A colorful nebula",
+        size="1024x1536",
+        quality="high",
+        timeout=300.0
+    )
+
+def _fable_completion(finish_reason: str, completion_tokens: int) -> MagicMock:
+    response = MagicMock()
+    response.choices[0].finish_reason = finish_reason
+    response.choices[0].message.content = '{"title": "Moon' if finish_reason == "length" else OpenAiResponse(
+        title="Moon Explorer",
+        fable="An astronaut explored the moon...",
+        moral="Curiosity is key.",
+        image_prompts=["Astronaut on moon surface"]
+    ).model_dump_json()
+    response.usage.prompt_tokens = 100
+    response.usage.completion_tokens = completion_tokens
+    response.usage.total_tokens = 100 + completion_tokens
+    return response
+
+def test_generate_fable_and_prompts_retries_cut_off_completion_with_cap(mock_settings, mock_openai_client, mock_file_io):
+    # given
+    mock_openai_client.chat.completions.create.side_effect = [
+        _fable_completion("length", 600),
+        _fable_completion("stop", 700)
+    ]
+
+    # when
+    result = generate_fable_and_prompts("Moon Base Alpha", "Curious Astronaut", 3, 1, profile=GENERATION_PROFILES["fast"])
+
+    # then
+    calls = mock_openai_client.chat.completions.create.call_args_list
+    assert [c[1]['max_tokens'] for c in calls] == [600, 1000]
+    assert result.title == "Moon Explorer"
+    assert result.usage == TokenUsage(prompt_tokens=200, completion_tokens=1300, total_tokens=1500)
+
+def test_generate_fable_and_prompts_rejects_completion_cut_off_at_cap(mock_settings, mock_openai_client, mock_file_io):
+    # given
+    mock_openai_client.chat.completions.create.side_effect = [
+        _fable_completion("length", 600),
+        _fable_completion("length", 1000)
+    ]
+
+    # when / then
+    with pytest.raises(ValueError, match="cut off at the 1000 token limit of the fast profile"):
+        generate_fable_and_prompts("Moon Base Alpha", "Curious Astronaut", 3, 1, profile=GENERATION_PROFILES["fast"])
+
+def test_generate_fable_and_prompts_budgets_default_images_when_num_images_is_none(mock_settings, mock_openai_client, mock_file_io):
+    # given
+    mock_openai_client.chat.completions.create.return_value = _fable_completion("stop", 500)
+
+    # when
+    generate_fable_and_prompts("Moon Base Alpha", "Curious Astronaut", 10, None, profile=GENERATION_PROFILES["fast"])
+    generate_fable_and_prompts("Moon Base Alpha", "Curious Astronaut", 10, 2, profile=GENERATION_PROFILES["fast"])
+
+    # then
+    default_budget, two_images_budget = [c[1]['max_tokens'] for c in mock_openai_client.chat.completions.create.call_args_list]
+    assert default_budget == two_images_budget
@@ -0,0 +1,115 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from app.core.config import Settings
+from app.core.readiness import ReadinessMonitor
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def settings():
+    test_settings = Settings(
+        max_concurrent_generations=1,
+        openai_max_connections=1,
+        loop_lag_sample_interval=0.01,
+        readiness_max_loop_lag_ms=100.0,
+        readiness_max_queue_depth=0
+    )
+    with patch("app.core.readiness.get_settings", return_value=test_settings):
+        yield test_settings
+
+async def test_idle_monitor_is_ready(settings):
+    # when
+    readiness = ReadinessMonitor().snapshot()
+
+    # then
+    assert readiness.status == "ready"
+    assert readiness.reasons == []
+    assert readiness.loop_lag_ms == 0.0
+
+async def test_blocked_event_loop_is_not_ready(settings):
+    # given
+    monitor = ReadinessMonitor()
+    monitor.start()
+    await asyncio.sleep(0.02)
+
+    # when
+    time.sleep(0.2)  # Block the loop like a synchronous OpenAI call would
+    await asyncio.sleep(0.02)
+    readiness = monitor.snapshot()
+    await monitor.stop()
+
+    # then
+    assert readiness.status == "not_ready"
+    assert readiness.loop_lag_ms >= 100.0
+    assert "event loop lag" in readiness.reasons[0]
+
+async def test_queued_generations_are_not_ready(settings):
+    # given
+    monitor = ReadinessMonitor()
+    release = asyncio.Event()
+
+    async def generate():
+        async with monitor.generation_slot():
+            await release.wait()
+
+    tasks = [asyncio.create_task(generate()) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    # when
+    readiness = monitor.snapshot()
+    release.set()
+    await asyncio.gather(*tasks)
+
+    # then
+    assert readiness.generations_in_progress == 1
+    assert readiness.queue_depth == 1
+    assert readiness.status == "not_ready"
+    assert monitor.snapshot().status == "ready"
+
+async def test_pool_utilization_is_reported():
+    # given
+    test_settings = Settings(max_concurrent_generations=2, openai_max_connections=2, readiness_max_pool_utilization=0.5)
+    with patch("app.core.readiness.get_settings", return_value=test_settings):
+        monitor = ReadinessMonitor()
+
+        # when
+        async with monitor.generation_slot():
+            with monitor.upstream_call():
+                busy = monitor.snapshot()
+                async with monitor.generation_slot():
+                    with monitor.upstream_call():
+                        saturated = monitor.snapshot()
+        idle = monitor.snapshot()
+
+    # then
+    assert busy.pool_utilization == 0.5
+    assert busy.status == "ready"
+    assert saturated.pool_utilization == 1.0
+    assert saturated.status == "not_ready"
+    assert idle.pool_utilization == 0.0
+
+async def test_pool_utilization_is_relative_to_usable_connections():
+    # given
+    test_settings = Settings(max_concurrent_generations=4, openai_max_connections=20)
+    with patch("app.core.readiness.get_settings", return_value=test_settings):
+        monitor = ReadinessMonitor()
+
+        # when
+        with monitor.upstream_call(), monitor.upstream_call(), monitor.upstream_call(), monitor.upstream_call():
+            saturated = monitor.snapshot()
+
+    # then
+    assert saturated.pool_utilization == 1.0
+    assert saturated.status == "not_ready"
+
+async def test_zero_connections_does_not_break_readiness():
+    # given
+    test_settings = Settings(openai_max_connections=0)
+    with patch("app.core.readiness.get_settings", return_value=test_settings):
+        # when
+        readiness = ReadinessMonitor().snapshot()
+
+    # then
+    assert readiness.pool_utilization == 0.0
@@ -0,0 +1,69 @@
+import pytest
+from io import BytesIO
+from unittest.mock import patch
+from app.services import reference_image
+from app.services.reference_image import prepare_reference_image, clear_reference_cache
+
+Image = pytest.importorskip("PIL.Image")
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_reference_cache()
+    yield
+    clear_reference_cache()
+
+def _png_bytes(size: int) -> bytes:
+    output = BytesIO()
+    Image.new("RGBA", (size, size), (200, 120, 40, 255)).save(output, format="PNG")
+    return output.getvalue()
+
+def test_prepare_reference_image_downscales_and_recompresses():
+    # given
+    original = _png_bytes(1024)
+
+    # when
+    with patch.object(reference_image.settings, "reference_image_max_size", 256), \
+         patch.object(reference_image.settings, "reference_image_format", "jpeg"):
+        prepared = prepare_reference_image(original)
+
+    # then
+    assert prepared.name == "image.jpeg"
+    with Image.open(prepared) as image:
+        assert image.format == "JPEG"
+        assert image.size == (256, 256)
+
+def test_prepare_reference_image_is_cached_by_content():
+    # given
+    original = _png_bytes(64)
+
+    # when
+    with patch("app.services.reference_image._encode_reference", wraps=reference_image._encode_reference) as mock_encode:
+        first = prepare_reference_image(original)
+        second = prepare_reference_image(bytes(original))
+
+    # then
+    mock_encode.assert_called_once()
+    assert first is not second
+    assert first.read() == second.read()
+
+def test_prepare_reference_image_evicts_least_recently_used():
+    # given
+    images = [_png_bytes(size) for size in (16, 32, 48)]
+
+    # when
+    with patch.object(reference_image.settings, "reference_image_cache_size", 2), \
+         patch("app.services.reference_image._encode_reference", wraps=reference_image._encode_reference) as mock_encode:
+        for image_bytes in images:
+            prepare_reference_image(image_bytes)
+        prepare_reference_image(images[0])
+
+    # then
+    assert mock_encode.call_count == 4
+
+def test_prepare_reference_image_falls_back_on_undecodable_input():
+    # when
+    prepared = prepare_reference_image(b"not an image")
+
+    # then
+    assert prepared.name == "image.png"
+    assert prepared.read() == b"not an image"